@@ -10,12 +10,13 @@ sudo -u evap ./manage.py compilemessages
 sudo -u evap ./manage.py collectstatic --noinput
 sudo -u evap ./manage.py compress --verbosity=0
 sudo -u evap ./manage.py migrate
+sudo -u evap ./manage.py createcachetable
 # reload only after static files are updated, so the new code finds all the files it expects.
 # also, reload after migrations happened. see https://github.com/fsr-itse/EvaP/pull/817 for a discussion.
 sudo service apache2 reload
-# update caches. this can take minutes but doesn't need a reload.
-sudo -u evap ./manage.py clear_cache
-sudo -u evap ./manage.py refresh_results_cache
+# update caches. the results are replaced in place, so they are never missing while this runs.
+sudo -u evap ./manage.py clear_caches shared users
+sudo -u evap ./manage.py refresh_results_cache --processes 4
 
 { set +x; } 2>/dev/null # don't print the echo command, and don't print the 'set +x' itself
 
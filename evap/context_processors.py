@@ -1,4 +1,7 @@
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from evap.evaluation.tools import get_navbar_cache_version
 
 
 def legal_notice_active(request):
@@ -7,3 +10,8 @@ def legal_notice_active(request):
 
 def tracker_url(request):
     return {'TRACKER_URL': settings.TRACKER_URL}
+
+
+def navbar_cache_version(request):
+    # evaluated lazily, so that the cache is only accessed by pages showing the navbar
+    return {'NAVBAR_CACHE_VERSION': SimpleLazyObject(get_navbar_cache_version)}
@@ -0,0 +1,193 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+# the local tiers are shared by all threads of a process, like the entries of django's LocMemCache
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+_missing = object()
+
+
+class LocalTier(object):
+    """A thread-safe LRU storing pickled values, bounded by the total size of the pickled values in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (pickled value, expiry time)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _missing
+            pickled, expiry = entry
+            if expiry <= time.monotonic():
+                self._remove(key)
+                return _missing
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._remove(key)
+            if timeout <= 0 or len(pickled) > self.max_bytes:
+                return
+            while self.size + len(pickled) > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+            self.entries[key] = (pickled, time.monotonic() + timeout)
+            self.size += len(pickled)
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+def get_local_tier(name, max_bytes):
+    with _local_tiers_lock:
+        if name not in _local_tiers:
+            _local_tiers[name] = LocalTier(max_bytes)
+        return _local_tiers[name]
+
+
+class TwoTierCache(BaseCache):
+    """
+    Cache backend storing all entries in shared caches and keeping recently used entries of
+    selected namespaces in an in-process LRU tier in front of them.
+
+    The keys are routed to the shared caches by their prefix as given in the NAMESPACES option,
+    so that every namespace has its own size limit and culling and e.g. the results of published
+    courses are never culled because of template fragments. All other keys go to DEFAULT_BACKEND.
+
+    Other processes don't notice when an entry is changed or deleted, so they can return the old
+    value from their local tier for up to LOCAL_TIMEOUT seconds. Only namespaces whose entries
+    are not changed in place should therefore use the local tier, and never e.g. version keys.
+    Setting MAX_LOCAL_BYTES to 0 disables the local tier.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.default_backend = options['DEFAULT_BACKEND']
+        # list of (key prefix, cache alias, whether the entries may be kept in the local tier)
+        self.namespaces = list(options.get('NAMESPACES', []))
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 300)
+        max_local_bytes = options.get('MAX_LOCAL_BYTES', 0)
+        self.local_tier = get_local_tier(location, max_local_bytes) if max_local_bytes > 0 else None
+
+    def get_backend(self, key):
+        """Returns the shared cache responsible for the key and whether the key may be kept in the local tier."""
+        for prefix, alias, use_local_tier in self.namespaces:
+            if key.startswith(prefix):
+                return caches[alias], use_local_tier and self.local_tier is not None
+        return caches[self.default_backend], False
+
+    def get_local_timeout(self, timeout):
+        if timeout is None or timeout is DEFAULT_TIMEOUT:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        backend, use_local_tier = self.get_backend(key)
+        if use_local_tier:
+            value = self.local_tier.get((key, version))
+            if value is not _missing:
+                return value
+        value = backend.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        if use_local_tier:
+            self.local_tier.set((key, version), value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        keys_by_backend = OrderedDict()
+        for key in keys:
+            backend, use_local_tier = self.get_backend(key)
+            if use_local_tier:
+                value = self.local_tier.get((key, version))
+                if value is not _missing:
+                    result[key] = value
+                    continue
+            keys_by_backend.setdefault(backend, (use_local_tier, []))[1].append(key)
+
+        for backend, (use_local_tier, backend_keys) in keys_by_backend.items():
+            values = backend.get_many(backend_keys, version=version)
+            if use_local_tier:
+                for key, value in values.items():
+                    self.local_tier.set((key, version), value, self.local_timeout)
+            result.update(values)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        backend, use_local_tier = self.get_backend(key)
+        backend.set(key, value, timeout=timeout, version=version)
+        if use_local_tier:
+            self.local_tier.set((key, version), value, self.get_local_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data_by_backend = OrderedDict()
+        for key, value in data.items():
+            backend, use_local_tier = self.get_backend(key)
+            data_by_backend.setdefault(backend, {})[key] = value
+            if use_local_tier:
+                self.local_tier.set((key, version), value, self.get_local_timeout(timeout))
+        for backend, backend_data in data_by_backend.items():
+            backend.set_many(backend_data, timeout=timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        backend, use_local_tier = self.get_backend(key)
+        added = backend.add(key, value, timeout=timeout, version=version)
+        if use_local_tier and added:
+            self.local_tier.set((key, version), value, self.get_local_timeout(timeout))
+        return added
+
+    def delete(self, key, version=None):
+        backend, use_local_tier = self.get_backend(key)
+        if use_local_tier:
+            self.local_tier.delete((key, version))
+        backend.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys_by_backend = OrderedDict()
+        for key in keys:
+            backend, use_local_tier = self.get_backend(key)
+            if use_local_tier:
+                self.local_tier.delete((key, version))
+            keys_by_backend.setdefault(backend, []).append(key)
+        for backend, backend_keys in keys_by_backend.items():
+            backend.delete_many(backend_keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def incr(self, key, delta=1, version=None):
+        backend, use_local_tier = self.get_backend(key)
+        if use_local_tier:
+            self.local_tier.delete((key, version))
+        return backend.incr(key, delta, version=version)
+
+    def clear(self):
+        if self.local_tier is not None:
+            self.local_tier.clear()
+        aliases = [self.default_backend] + [alias for __, alias, __ in self.namespaces]
+        for alias in OrderedDict.fromkeys(aliases):
+            caches[alias].clear()
@@ -0,0 +1,173 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.backends.django import Template
+
+
+logger = logging.getLogger(__name__)
+
+STATISTICS_CACHE_KEY = 'evap.evaluation.instrumentation.statistics'
+STATISTICS_FIELDS = ['requests', 'time', 'max_time', 'queries', 'query_time', 'cache_hits', 'cache_misses', 'template_time']
+
+_local = threading.local()
+_missing = object()
+
+
+class RequestRecording(object):
+    """Records the wall time, SQL queries, cache accesses and template render time of a single request."""
+
+    def __init__(self):
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # the connection logs all queries while force_debug_cursor is set, the log is reset at the start of every request
+        self.previous_force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        self.initial_query_count = len(connection.queries_log)
+        self.start = time.perf_counter()
+
+    def finish(self):
+        """Stops the recording and returns the measurements as dict."""
+        duration = time.perf_counter() - self.start
+        connection.force_debug_cursor = self.previous_force_debug_cursor
+        queries = list(connection.queries_log)[self.initial_query_count:]
+        return {
+            'time': duration,
+            'queries': len(queries),
+            'query_time': sum(float(query['time']) for query in queries),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_time': self.template_time,
+        }
+
+
+def get_current_recording():
+    return getattr(_local, 'recording', None)
+
+
+def install_hooks():
+    """Wraps the default cache backend and the template rendering so that they report to the recording of the current thread.
+    The caches used by the default cache are not wrapped, so that accesses to them are not counted twice."""
+    backend_class = type(caches[DEFAULT_CACHE_ALIAS])
+    if not getattr(backend_class, '_evap_instrumented', False):
+        backend_class.get = _wrap_cache_get(backend_class.get)
+        backend_class.get_many = _wrap_cache_get_many(backend_class.get_many)
+        backend_class._evap_instrumented = True
+
+    if not getattr(Template, '_evap_instrumented', False):
+        Template.render = _wrap_template_render(Template.render)
+        Template._evap_instrumented = True
+
+
+def _wrap_cache_get(get):
+    def instrumented_get(self, key, default=None, version=None):
+        recording = get_current_recording()
+        if recording is None:
+            return get(self, key, default=default, version=version)
+        value = get(self, key, default=_missing, version=version)
+        if value is _missing:
+            recording.cache_misses += 1
+            return default
+        recording.cache_hits += 1
+        return value
+    return instrumented_get
+
+
+def _wrap_cache_get_many(get_many):
+    def instrumented_get_many(self, keys, version=None):
+        keys = list(keys)
+        values = get_many(self, keys, version=version)
+        recording = get_current_recording()
+        if recording is not None:
+            recording.cache_hits += len(values)
+            recording.cache_misses += len(keys) - len(values)
+        return values
+    return instrumented_get_many
+
+
+def _wrap_template_render(render):
+    def instrumented_render(self, *args, **kwargs):
+        recording = get_current_recording()
+        if recording is None:
+            return render(self, *args, **kwargs)
+        # templates rendered while rendering another template are already measured as part of the outer one
+        recording.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            recording.template_depth -= 1
+            if recording.template_depth == 0:
+                recording.template_time += time.perf_counter() - start
+    return instrumented_render
+
+
+def record_measurements(url_name, measurements):
+    """Adds the measurements of a request to the statistics of its URL name. Concurrent requests
+    might overwrite each other's updates, which is acceptable for sampled statistics."""
+    statistics = cache.get(STATISTICS_CACHE_KEY) or {}
+    url_statistics = statistics.setdefault(url_name, {field: 0 for field in STATISTICS_FIELDS})
+    url_statistics['requests'] += 1
+    url_statistics['max_time'] = max(url_statistics['max_time'], measurements['time'])
+    for field in ['time', 'queries', 'query_time', 'cache_hits', 'cache_misses', 'template_time']:
+        url_statistics[field] += measurements[field]
+    cache.set(STATISTICS_CACHE_KEY, statistics, None)
+
+
+def get_request_statistics():
+    """Returns a list of dicts containing the URL name and the accumulated and average measurements
+    of all recorded requests to that URL, sorted by their total time."""
+    result = []
+    for url_name, url_statistics in (cache.get(STATISTICS_CACHE_KEY) or {}).items():
+        entry = dict(url_statistics, url_name=url_name)
+        for field in ['time', 'queries', 'query_time', 'cache_hits', 'cache_misses', 'template_time']:
+            entry['average_' + field] = url_statistics[field] / url_statistics['requests']
+        result.append(entry)
+    return sorted(result, key=lambda entry: entry['time'], reverse=True)
+
+
+def reset_request_statistics():
+    cache.delete(STATISTICS_CACHE_KEY)
+
+
+class RequestInstrumentationMiddleware(object):
+    """
+    Middleware recording the wall time, the number and duration of SQL queries, the cache hits
+    and misses and the template render time of a sample of all requests.
+
+    The share of recorded requests is set with REQUEST_INSTRUMENTATION_SAMPLE_RATE. The
+    measurements are logged and accumulated per URL name, see get_request_statistics.
+    The middleware only installs its hooks if requests are sampled at all.
+    """
+
+    def __init__(self):
+        if settings.REQUEST_INSTRUMENTATION_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed()
+        install_hooks()
+
+    def process_request(self, request):
+        _local.recording = None
+        if random.random() < settings.REQUEST_INSTRUMENTATION_SAMPLE_RATE:
+            _local.recording = RequestRecording()
+
+    def process_response(self, request, response):
+        recording = get_current_recording()
+        if recording is None:
+            return response
+        _local.recording = None
+        measurements = recording.finish()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        url_name = resolver_match.view_name if resolver_match else "<unresolved>"
+        logger.info("url_name={} status={} time={:.4f} queries={} query_time={:.4f} cache_hits={} cache_misses={} template_time={:.4f}".format(
+            url_name, response.status_code, measurements['time'], measurements['queries'], measurements['query_time'],
+            measurements['cache_hits'], measurements['cache_misses'], measurements['template_time']))
+        record_measurements(url_name, measurements)
+        return response
@@ -0,0 +1,173 @@
+import datetime
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from evap.evaluation.models import Contribution, Course, CourseType, Question, Questionnaire, RatingAnswerAggregate, \
+                                   RatingAnswerCounter, Semester, TextAnswer, UserProfile
+from evap.student.tools import make_form_identifier
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Creates a synthetic semester, lets all participants vote concurrently and reports throughput, latencies and query counts'
+
+    prefix = 'benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=10, help='Number of courses.')
+        parser.add_argument('--participants', type=int, default=50, help='Number of participants per course.')
+        parser.add_argument('--contributors', type=int, default=3, help='Number of contributors per course.')
+        parser.add_argument('--questions', type=int, default=10, help='Number of questions per questionnaire.')
+        parser.add_argument('--threads', type=int, default=1, help='Number of votes submitted concurrently. Keep at 1 for SQLite.')
+        parser.add_argument('--keep', action='store_true', default=False, help='Keep the generated data instead of deleting it.')
+        parser.add_argument('--noinput', action='store_false', dest='interactive', default=True, help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        if options['interactive'] and not settings.DEBUG:
+            self.stdout.write("DEBUG is disabled. Are you sure you are not running")
+            if input("on a production system and want to continue? (yes/no)") != "yes":
+                self.stdout.write("Aborting...")
+                return
+
+        random.seed(0)
+
+        self.stdout.write("Creating benchmark data...")
+        semester = self.create_semester(options['courses'], options['participants'], options['contributors'], options['questions'])
+
+        try:
+            votes = self.prepare_votes(semester)
+            self.stdout.write("Submitting {} votes using {} thread(s)...".format(len(votes), options['threads']))
+            start = time.perf_counter()
+            if options['threads'] > 1:
+                with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                    measurements = list(executor.map(self.submit_vote_in_thread, votes))
+            else:
+                measurements = [self.submit_vote(*vote) for vote in votes]
+            duration = time.perf_counter() - start
+
+            self.report(measurements, duration)
+        finally:
+            if not options['keep']:
+                self.stdout.write("Deleting benchmark data...")
+                self.delete_semester(semester)
+
+    def create_semester(self, num_courses, num_participants, num_contributors, num_questions):
+        suffix = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        name = "{} {}".format(self.prefix, suffix)
+
+        with transaction.atomic():
+            semester = Semester.objects.create(name_de=name, name_en=name)
+            course_type = CourseType.objects.create(name_de=name, name_en=name)
+
+            general_questionnaire = self.create_questionnaire(name + " general", num_questions, is_for_contributors=False)
+            contributor_questionnaire = self.create_questionnaire(name + " contributor", num_questions, is_for_contributors=True)
+
+            UserProfile.objects.bulk_create(
+                [UserProfile(username="{}_student_{}_{}".format(self.prefix, suffix, i)) for i in range(num_participants * num_courses)] +
+                [UserProfile(username="{}_contributor_{}_{}".format(self.prefix, suffix, i)) for i in range(num_contributors * num_courses)])
+            students = list(UserProfile.objects.filter(username__startswith="{}_student_{}_".format(self.prefix, suffix)))
+            contributors = list(UserProfile.objects.filter(username__startswith="{}_contributor_{}_".format(self.prefix, suffix)))
+
+            today = datetime.date.today()
+            for i in range(num_courses):
+                course = Course.objects.create(semester=semester, type=course_type, name_de="{} {}".format(name, i), name_en="{} {}".format(name, i),
+                                               vote_start_date=today - datetime.timedelta(days=1), vote_end_date=today + datetime.timedelta(days=1))
+                course.general_contribution.questionnaires = [general_questionnaire]
+                for j, contributor in enumerate(contributors[i * num_contributors:(i + 1) * num_contributors]):
+                    contribution = Contribution.objects.create(course=course, contributor=contributor, responsible=j == 0, can_edit=j == 0,
+                                                               comment_visibility=Contribution.ALL_COMMENTS if j == 0 else Contribution.OWN_COMMENTS)
+                    contribution.questionnaires = [contributor_questionnaire]
+                course.participants = students[i * num_participants:(i + 1) * num_participants]
+                # the course is created in this state directly to skip the whole preparation process
+                Course.objects.filter(pk=course.pk).update(state='in_evaluation')
+
+        return semester
+
+    def create_questionnaire(self, name, num_questions, is_for_contributors):
+        questionnaire = Questionnaire.objects.create(name_de=name, name_en=name, public_name_de=name, public_name_en=name, is_for_contributors=is_for_contributors)
+        question_types = ["L", "G", "T"]
+        Question.objects.bulk_create(Question(questionnaire=questionnaire, order=i, text_de=str(i), text_en=str(i), type=question_types[i % len(question_types)])
+                                     for i in range(num_questions))
+        return questionnaire
+
+    def prepare_votes(self, semester):
+        """Returns a list of (user, course, POST data) tuples, one for each participant of each course."""
+        votes = []
+        courses = semester.course_set.prefetch_related("participants", "contributions__questionnaires__question_set")
+        for course in courses:
+            for participant in course.participants.all():
+                post_data = {}
+                for contribution in course.contributions.all():
+                    for questionnaire in contribution.questionnaires.all():
+                        for question in questionnaire.question_set.all():
+                            identifier = make_form_identifier(contribution, questionnaire, question)
+                            if question.is_text_question:
+                                post_data[identifier] = "benchmark answer"
+                            else:
+                                post_data[identifier] = random.randint(1, 6)
+                votes.append((participant, course, post_data))
+        return votes
+
+    def submit_vote_in_thread(self, vote):
+        try:
+            return self.submit_vote(*vote)
+        finally:
+            # every thread gets its own database connection which has to be closed explicitly
+            connection.close()
+
+    def submit_vote(self, user, course, post_data):
+        # the test client's default host "testserver" is not allowed outside of tests
+        host = settings.ALLOWED_HOSTS[0].lstrip('.') if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        url = reverse('student:vote', kwargs={'course_id': course.id})
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.post(url, post_data)
+            latency = time.perf_counter() - start
+
+        if response.status_code != 302:
+            raise CommandError('The vote of user "{}" for course "{}" failed with status code {}.'.format(user.username, course.id, response.status_code))
+        return latency, len(queries)
+
+    def report(self, measurements, duration):
+        latencies = sorted(latency for latency, __ in measurements)
+        query_counts = [query_count for __, query_count in measurements]
+
+        def percentile(percent):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000
+
+        self.stdout.write("Votes: {}".format(len(measurements)))
+        if not measurements:
+            return
+        self.stdout.write("Throughput: {:.1f} votes/s".format(len(measurements) / duration))
+        self.stdout.write("Latency: p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms".format(
+            percentile(50), percentile(90), percentile(99), latencies[-1] * 1000))
+        self.stdout.write("Queries per vote: average {:.1f}, max {}".format(sum(query_counts) / len(query_counts), max(query_counts)))
+
+    def delete_semester(self, semester):
+        with transaction.atomic():
+            users = list(UserProfile.objects.filter(courses_participating_in__semester=semester)) + \
+                list(UserProfile.objects.filter(contributions__course__semester=semester))
+            questionnaires = list(Questionnaire.objects.filter(contributions__course__semester=semester).distinct())
+            course_types = list(CourseType.objects.filter(courses__semester=semester).distinct())
+
+            for model in [TextAnswer, RatingAnswerCounter, RatingAnswerAggregate]:
+                model.objects.filter(contribution__course__semester=semester).delete()
+            semester.course_set.all().delete()
+            semester.delete()
+
+            for questionnaire in questionnaires:
+                questionnaire.delete()
+            for course_type in course_types:
+                course_type.delete()
+            UserProfile.objects.filter(pk__in=[user.pk for user in users]).delete()
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    args = '<cache alias cache alias ...>'
+    help = 'Clears the caches with the given aliases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='+', choices=sorted(settings.CACHES.keys()), help='Aliases of the caches to clear.')
+
+    def handle(self, *args, **options):
+        for alias in options['aliases']:
+            caches[alias].clear()
+            self.stdout.write('Cleared the cache "{}".'.format(alias))
@@ -0,0 +1,263 @@
+import datetime
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from evap.evaluation.models import Contribution, Course, CourseType, Degree, Question, Questionnaire, RatingAnswerAggregate, \
+                                   RatingAnswerCounter, Semester, TextAnswer, UserProfile
+from evap.evaluation.tools import store_published_rating_results
+
+
+FIRST_NAMES = ["Anna", "Ben", "Clara", "David", "Emma", "Felix", "Greta", "Hannes", "Ida", "Jonas", "Karla", "Lukas", "Mia", "Noah", "Paula", "Tim"]
+LAST_NAMES = ["Becker", "Fischer", "Hoffmann", "Koch", "Meyer", "Müller", "Richter", "Schmidt", "Schneider", "Schulz", "Wagner", "Weber"]
+WORDS = ["lecture", "exercise", "slides", "exam", "examples", "helpful", "interesting", "boring", "fast", "slow", "clear", "confusing",
+         "great", "more", "less", "please", "project", "tutor", "homework", "time"]
+
+# the states of the courses in the most recent semester, with their relative frequency
+CURRENT_SEMESTER_STATES = [('new', 1), ('prepared', 1), ('editor_approved', 1), ('approved', 2), ('in_evaluation', 4), ('evaluated', 2), ('reviewed', 1), ('published', 2)]
+STATES_WITH_VOTES = ['in_evaluation', 'evaluated', 'reviewed', 'published']
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Generates a large deterministic data set for profiling and benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semesters', type=int, default=4, help='Number of semesters. All but the most recent one are published.')
+        parser.add_argument('--courses', type=int, default=500, help='Number of courses per semester.')
+        parser.add_argument('--students', type=int, default=20000, help='Number of students.')
+        parser.add_argument('--contributors', type=int, default=2000, help='Number of contributors.')
+        parser.add_argument('--participants', type=int, default=40, help='Median number of participants per course.')
+        parser.add_argument('--participant-skew', type=float, default=1.0, dest='participant_skew',
+                            help='Skew of the course sizes (sigma of a log-normal distribution). 0 makes all courses equally large.')
+        parser.add_argument('--max-contributors', type=int, default=4, dest='max_contributors', help='Maximum number of contributors per course.')
+        parser.add_argument('--participation', type=float, default=0.6, help='Average share of the participants who voted.')
+        parser.add_argument('--text-answer-rate', type=float, default=0.3, dest='text_answer_rate',
+                            help='Average share of the voters who answered a text question.')
+        parser.add_argument('--questions', type=int, default=10, help='Number of questions per questionnaire.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the random number generator.')
+        parser.add_argument('--noinput', action='store_false', dest='interactive', default=True, help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        if options['interactive'] and not settings.DEBUG:
+            self.stdout.write("DEBUG is disabled. Are you sure you are not running")
+            if input("on a production system and want to continue? (yes/no)") != "yes":
+                self.stdout.write("Aborting...")
+                return
+
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.next_ids = {}
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            self.stdout.write("Creating users, questionnaires and course types...")
+            students = self.create_users("student", options['students'])
+            contributors = self.create_users("contributor", options['contributors'])
+            degrees = self.create_named_objects(Degree, "Degree", 5)
+            course_types = self.create_named_objects(CourseType, "Course type", 8)
+            general_questionnaires = self.create_questionnaires(3, is_for_contributors=False)
+            contributor_questionnaires = self.create_questionnaires(2, is_for_contributors=True)
+
+            published_course_ids = []
+            for semester_index in range(options['semesters']):
+                is_current = semester_index == options['semesters'] - 1
+                self.stdout.write("Creating semester {} of {}...".format(semester_index + 1, options['semesters']))
+                semester = self.create_named_objects(Semester, "Semester", 1)[0]
+                # semesters are half a year apart, the most recent one is currently evaluated
+                evaluation_date = datetime.date.today() - datetime.timedelta(days=182 * (options['semesters'] - 1 - semester_index))
+                courses = self.create_courses(semester, evaluation_date, is_current, degrees, course_types)
+                contributions = self.create_contributions(courses, contributors, general_questionnaires, contributor_questionnaires)
+                voter_counts = self.create_participants_and_voters(courses, students)
+                self.create_answers(courses, contributions, voter_counts)
+                published_course_ids += [course.id for course in courses if course.state == 'published']
+
+            self.reset_sequences()
+
+        self.stdout.write("Storing the results of {} published courses...".format(len(published_course_ids)))
+        with transaction.atomic():
+            for course in Course.objects.filter(id__in=published_course_ids):
+                store_published_rating_results(course)
+        # the objects were created without sending signals
+        Semester.invalidate_published_courses_cache()
+
+        self.stdout.write("Done after {:.1f} s. The database now contains {} users, {} courses, {} rating answer counters and {} text answers.".format(
+            time.perf_counter() - start, UserProfile.objects.count(), Course.objects.count(), RatingAnswerCounter.objects.count(), TextAnswer.objects.count()))
+
+    def allocate_ids(self, model, count):
+        """Returns a range of unused primary keys. The objects are created with explicit ids
+        because bulk_create does not return primary keys on all databases."""
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        start = self.next_ids[model]
+        self.next_ids[model] += count
+        return range(start, start + count)
+
+    def reset_sequences(self):
+        """Updates the database sequences after creating objects with explicit ids."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(self.next_ids)):
+                cursor.execute(sql)
+
+    def create_users(self, kind, count):
+        ids = self.allocate_ids(UserProfile, count)
+        domain = settings.INSTITUTION_EMAIL_DOMAINS[0] if settings.INSTITUTION_EMAIL_DOMAINS else "example.com"
+        UserProfile.objects.bulk_create(UserProfile(id=id, username="{}{}".format(kind, id), email="{}{}@{}".format(kind, id, domain),
+                                                    first_name=self.random.choice(FIRST_NAMES), last_name=self.random.choice(LAST_NAMES))
+                                        for id in ids)
+        return list(ids)
+
+    def create_named_objects(self, model, name, count):
+        ids = self.allocate_ids(model, count)
+        model.objects.bulk_create(model(id=id, name_de="{} {}".format(name, id), name_en="{} {}".format(name, id)) for id in ids)
+        return list(model.objects.filter(id__in=ids))
+
+    def create_questionnaires(self, count, is_for_contributors):
+        questionnaire_ids = self.allocate_ids(Questionnaire, count)
+        Questionnaire.objects.bulk_create(Questionnaire(id=id, name_de="Questionnaire {}".format(id), name_en="Questionnaire {}".format(id),
+                                                        public_name_de="Questionnaire {}".format(id), public_name_en="Questionnaire {}".format(id),
+                                                        is_for_contributors=is_for_contributors)
+                                          for id in questionnaire_ids)
+
+        questions = []
+        for questionnaire_id in questionnaire_ids:
+            for order, question_id in enumerate(self.allocate_ids(Question, self.options['questions'])):
+                # mostly likert questions, a grade question at the start and every fourth question is a text question
+                question_type = "G" if order == 0 else "T" if order % 4 == 3 else "L"
+                questions.append(Question(id=question_id, questionnaire_id=questionnaire_id, order=order, type=question_type,
+                                          text_de="Question {}".format(question_id), text_en="Question {}".format(question_id)))
+        Question.objects.bulk_create(questions)
+
+        return list(Questionnaire.objects.filter(id__in=questionnaire_ids).prefetch_related("question_set"))
+
+    def create_courses(self, semester, evaluation_date, is_current, degrees, course_types):
+        states, weights = zip(*CURRENT_SEMESTER_STATES)
+        courses = []
+        for id in self.allocate_ids(Course, self.options['courses']):
+            state = self.weighted_choice(states, weights) if is_current else 'published'
+            course = Course(id=id, state=state, semester=semester, name_de="Course {}".format(id), name_en="Course {}".format(id), type=self.random.choice(course_types),
+                            is_graded=self.random.random() < 0.8, is_private=self.random.random() < 0.05,
+                            vote_start_date=evaluation_date - datetime.timedelta(days=7), vote_end_date=evaluation_date + datetime.timedelta(days=7))
+            courses.append(course)
+        Course.objects.bulk_create(courses)
+
+        Course.degrees.through.objects.bulk_create(Course.degrees.through(course_id=course.id, degree_id=degree.id)
+                                                   for course in courses for degree in self.random.sample(degrees, self.random.randint(1, 2)))
+        return courses
+
+    def create_contributions(self, courses, contributors, general_questionnaires, contributor_questionnaires):
+        """Creates the general contribution and the contributor contributions of the courses.
+        Returns a dict mapping each course id to a list of (contribution id, questionnaires) tuples."""
+        contributions = []
+        contribution_questionnaires = {}
+        for course in courses:
+            contributions.append(Contribution(course_id=course.id, contributor_id=None))
+            contribution_questionnaires[(course.id, None)] = self.random.sample(general_questionnaires, self.random.randint(1, 2))
+            course_contributors = self.random.sample(contributors, self.random.randint(1, self.options['max_contributors']))
+            for order, contributor_id in enumerate(course_contributors):
+                contributions.append(Contribution(course_id=course.id, contributor_id=contributor_id, order=order, responsible=order == 0, can_edit=order == 0,
+                                                  comment_visibility=Contribution.ALL_COMMENTS if order == 0 else Contribution.OWN_COMMENTS))
+                contribution_questionnaires[(course.id, contributor_id)] = [self.random.choice(contributor_questionnaires)]
+
+        for contribution, id in zip(contributions, self.allocate_ids(Contribution, len(contributions))):
+            contribution.id = id
+        Contribution.objects.bulk_create(contributions)
+
+        Contribution.questionnaires.through.objects.bulk_create(
+            Contribution.questionnaires.through(contribution_id=contribution.id, questionnaire_id=questionnaire.id)
+            for contribution in contributions for questionnaire in contribution_questionnaires[(contribution.course_id, contribution.contributor_id)])
+
+        contributions_by_course = {course.id: [] for course in courses}
+        for contribution in contributions:
+            contributions_by_course[contribution.course_id].append((contribution.id, contribution_questionnaires[(contribution.course_id, contribution.contributor_id)]))
+        return contributions_by_course
+
+    def create_participants_and_voters(self, courses, students):
+        """Returns a dict mapping each course id to its number of voters."""
+        participants = []
+        voters = []
+        voter_counts = {}
+        for course in courses:
+            size = self.options['participants']
+            if self.options['participant_skew'] > 0:
+                size = int(self.random.lognormvariate(math.log(size), self.options['participant_skew']))
+            size = max(1, min(len(students), size))
+            course_participants = self.random.sample(students, size)
+
+            voter_counts[course.id] = 0
+            if course.state in STATES_WITH_VOTES:
+                voter_counts[course.id] = round(size * self.random_share(self.options['participation']))
+            participants += [Course.participants.through(course_id=course.id, userprofile_id=student_id) for student_id in course_participants]
+            voters += [Course.voters.through(course_id=course.id, userprofile_id=student_id) for student_id in course_participants[:voter_counts[course.id]]]
+
+        Course.participants.through.objects.bulk_create(participants)
+        Course.voters.through.objects.bulk_create(voters)
+        # bulk_create doesn't send the signals updating the counts
+        Course.recalculate_participation_counts(courses)
+        return voter_counts
+
+    def create_answers(self, courses, contributions, voter_counts):
+        answer_counters = []
+        answer_aggregates = []
+        text_answers = []
+        for course in courses:
+            num_voters = voter_counts[course.id]
+            if num_voters == 0:
+                continue
+            for contribution_id, questionnaires in contributions[course.id]:
+                # every contribution gets its own tendency, answers around it are most likely
+                mean = self.random.uniform(1, 4)
+                weights = [math.exp(-(answer - mean) ** 2) for answer in range(1, 6)]
+                for questionnaire in questionnaires:
+                    for question in questionnaire.question_set.all():
+                        if question.is_text_question:
+                            for __ in range(round(num_voters * self.random_share(self.options['text_answer_rate']))):
+                                text_answers.append(TextAnswer(contribution_id=contribution_id, question_id=question.id,
+                                                               original_answer=" ".join(self.random.sample(WORDS, self.random.randint(3, 12))),
+                                                               state=self.text_answer_state(course)))
+                            continue
+                        counts = self.distribute(self.random.randint(num_voters // 2, num_voters), weights)
+                        if sum(counts) == 0:
+                            continue
+                        for answer, count in enumerate(counts, 1):
+                            if count > 0:
+                                answer_counters.append(RatingAnswerCounter(contribution_id=contribution_id, question_id=question.id, answer=answer, count=count))
+                        answer_aggregates.append(RatingAnswerAggregate(contribution_id=contribution_id, question_id=question.id, total_count=sum(counts),
+                                                                       answer_sum=sum(answer * count for answer, count in enumerate(counts, 1)),
+                                                                       answer_square_sum=sum(answer ** 2 * count for answer, count in enumerate(counts, 1))))
+
+        RatingAnswerCounter.objects.bulk_create(answer_counters)
+        RatingAnswerAggregate.objects.bulk_create(answer_aggregates)
+        TextAnswer.objects.bulk_create(text_answers)
+
+    def text_answer_state(self, course):
+        if course.state in ['in_evaluation', 'evaluated']:
+            return TextAnswer.NOT_REVIEWED
+        return self.weighted_choice([TextAnswer.PUBLISHED, TextAnswer.PRIVATE, TextAnswer.HIDDEN], [8, 1, 1])
+
+    def random_share(self, average):
+        """Returns a random share between 0 and 1 around the given average."""
+        average = min(max(average, 0.01), 0.99)
+        return self.random.betavariate(10 * average, 10 * (1 - average))
+
+    def distribute(self, total, weights):
+        """Splits the total into integer parts that are roughly proportional to the weights."""
+        weight_sum = sum(weights)
+        counts = [int(total * weight / weight_sum) for weight in weights]
+        for __ in range(total - sum(counts)):
+            counts[self.weighted_choice(range(len(weights)), weights)] += 1
+        return counts
+
+    def weighted_choice(self, choices, weights):
+        value = self.random.uniform(0, sum(weights))
+        for choice, weight in zip(choices, weights):
+            value -= weight
+            if value <= 0:
+                return choice
+        return choices[-1]
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from evap.evaluation.models import Course
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Recalculates the participant and voter counts of all courses and reports the ones that were wrong'
+
+    def handle(self, *args, **options):
+        corrected_courses = Course.recalculate_participation_counts()
+        for course in corrected_courses:
+            self.stdout.write('Corrected the counts of course "{}" (id {}) to {} participants and {} voters.'.format(
+                course, course.id, course.participant_count, course.voter_count))
+        self.stdout.write("{} course(s) had wrong participant or voter counts.".format(len(corrected_courses)))
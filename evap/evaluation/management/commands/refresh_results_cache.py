@@ -1,27 +1,65 @@
+import multiprocessing
+import time
+
 from django.core.management.base import BaseCommand
 from django.core.serializers.base import ProgressBar
-from django.core.cache import cache
+from django.db import connections
 
 from evap.evaluation.models import Course
-from evap.evaluation.tools import calculate_results
+from evap.evaluation.tools import refresh_results_cache
+
+
+def refresh_chunk(arguments):
+    course_ids, only_missing = arguments
+    return len(course_ids), refresh_results_cache(Course.objects.filter(pk__in=course_ids), only_missing)
 
 
 class Command(BaseCommand):
     args = ''
-    help = 'Clears the cache and pre-warms it with the results of all courses'
+    help = 'Calculates the results of all published courses and stores them in the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semester', type=int, action='append', dest='semesters',
+                            help='Only refresh the results of the semester with this id. Can be given several times.')
+        parser.add_argument('--only-missing', action='store_true', default=False, help='Only calculate results which are not cached yet.')
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--chunk-size', type=int, default=20, help='Number of courses calculated together by a worker.')
 
     def handle(self, *args, **options):
-        self.stdout.write("Clearing cache...")
-        cache.clear()
-        total_count = Course.objects.count()
+        courses = Course.objects.filter(state="published")
+        if options['semesters']:
+            courses = courses.filter(semester__in=options['semesters'])
+        course_ids = list(courses.order_by("pk").values_list("pk", flat=True))
+        if not course_ids:
+            self.stdout.write("There are no published courses to refresh.")
+            return
 
-        self.stdout.write("Calculating results for all courses...")
+        chunk_size = options['chunk_size']
+        chunks = [(course_ids[i:i + chunk_size], options['only_missing']) for i in range(0, len(course_ids), chunk_size)]
 
+        self.stdout.write("Calculating results for {} published courses using {} process(es)...".format(len(course_ids), options['processes']))
         self.stdout.ending = None
-        progress_bar = ProgressBar(self.stdout, total_count)
+        progress_bar = ProgressBar(self.stdout, len(course_ids))
+
+        start = time.perf_counter()
+        if options['processes'] > 1:
+            # the forked workers must open their own database connections instead of sharing the ones of this process
+            connections.close_all()
+            with multiprocessing.Pool(options['processes']) as pool:
+                calculated_count = self.process_chunks(pool.imap_unordered(refresh_chunk, chunks), progress_bar)
+        else:
+            calculated_count = self.process_chunks(map(refresh_chunk, chunks), progress_bar)
+        duration = time.perf_counter() - start
 
-        for counter, course in enumerate(Course.objects.all()):
-            progress_bar.update(counter + 1)
-            calculate_results(course)
+        self.stdout.write("\nResults cache has been refreshed: calculated {} of {} courses in {:.1f} s ({:.1f} courses/s).\n".format(
+            calculated_count, len(course_ids), duration, calculated_count / duration))
 
-        self.stdout.write("Results cache has been refreshed.\n")
+    def process_chunks(self, chunk_results, progress_bar):
+        """Updates the progress bar for each finished chunk and returns the number of calculated courses."""
+        done_count = 0
+        calculated_count = 0
+        for chunk_course_count, chunk_calculated_count in chunk_results:
+            done_count += chunk_course_count
+            calculated_count += chunk_calculated_count
+            progress_bar.update(done_count)
+        return calculated_count
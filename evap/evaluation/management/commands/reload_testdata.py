@@ -33,4 +33,7 @@ class Command(BaseCommand):
         self.stdout.write('Executing "python manage.py load_testdata"')
         call_command("loaddata", "test_data")
 
+        self.stdout.write('Executing "python manage.py recalculate_participation_counts"')
+        call_command("recalculate_participation_counts")
+
         self.stdout.write('Done.')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0052_add_course_is_private'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedRatingResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_count', models.IntegerField(verbose_name='total count')),
+                ('average', models.FloatField(blank=True, null=True, verbose_name='average')),
+                ('deviation', models.FloatField(blank=True, null=True, verbose_name='deviation')),
+                ('warning', models.BooleanField(default=False, verbose_name='warning')),
+                ('count_1', models.IntegerField(default=0)),
+                ('count_2', models.IntegerField(default=0)),
+                ('count_3', models.IntegerField(default=0)),
+                ('count_4', models.IntegerField(default=0)),
+                ('count_5', models.IntegerField(default=0)),
+                ('contribution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='published_rating_results', to='evaluation.Contribution')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='published_rating_results', to='evaluation.Course')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='published_rating_results', to='evaluation.Question')),
+            ],
+            options={
+                'verbose_name': 'published rating result',
+                'verbose_name_plural': 'published rating results',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='publishedratingresult',
+            unique_together=set([('contribution', 'question')]),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populateRatingAnswerAggregates(apps, schema_editor):
+    RatingAnswerCounter = apps.get_model('evaluation', 'RatingAnswerCounter')
+    RatingAnswerAggregate = apps.get_model('evaluation', 'RatingAnswerAggregate')
+
+    aggregates = {}
+    for counter in RatingAnswerCounter.objects.all():
+        key = (counter.contribution_id, counter.question_id)
+        if key not in aggregates:
+            aggregates[key] = RatingAnswerAggregate(contribution_id=counter.contribution_id, question_id=counter.question_id)
+        aggregate = aggregates[key]
+        aggregate.total_count += counter.count
+        aggregate.answer_sum += counter.answer * counter.count
+        aggregate.answer_square_sum += counter.answer ** 2 * counter.count
+    RatingAnswerAggregate.objects.bulk_create(aggregates.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0053_publishedratingresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingAnswerAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_count', models.IntegerField(default=0, verbose_name='total count')),
+                ('answer_sum', models.IntegerField(default=0, verbose_name='sum of answers')),
+                ('answer_square_sum', models.IntegerField(default=0, verbose_name='sum of squared answers')),
+                ('contribution', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='rating_answer_aggregates', to='evaluation.Contribution')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='evaluation.Question')),
+            ],
+            options={
+                'verbose_name': 'rating answer aggregate',
+                'verbose_name_plural': 'rating answer aggregates',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='ratingansweraggregate',
+            unique_together=set([('question', 'contribution')]),
+        ),
+        migrations.RunPython(populateRatingAnswerAggregates, migrations.RunPython.noop),
+    ]
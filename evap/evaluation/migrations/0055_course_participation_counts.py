@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populateParticipationCounts(apps, schema_editor):
+    Course = apps.get_model('evaluation', 'Course')
+
+    for course in Course.objects.all():
+        Course.objects.filter(pk=course.pk).update(participant_count=course.participants.count(), voter_count=course.voters.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluation', '0054_ratingansweraggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='participant_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='number of participants'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='voter_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='number of voters'),
+        ),
+        migrations.RunPython(populateParticipationCounts, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,16 @@
 import datetime
 import random
 import logging
+from collections import Counter, OrderedDict, defaultdict
+from math import sqrt
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
 from django.db import models, transaction
-from django.db.models import Count, Q
+from django.db.models import Case, Count, F, Q, When
 from django.dispatch import Signal, receiver
 from django.template.base import TemplateSyntaxError, TemplateEncodingError
 from django.template import Context, Template
@@ -78,9 +81,20 @@ class Semester(models.Model, metaclass=LocalizeModelBase):
         self.is_archived = True
         self.save()
 
+    PUBLISHED_COURSES_CACHE_KEY = 'evap.evaluation.models.semesters_with_published_courses'
+
     @classmethod
     def get_all_with_published_courses(cls):
-        return cls.objects.filter(course__state="published").distinct()
+        """Returns the list of semesters having published courses. The list is cached
+        until a course is published or unpublished or a semester is changed."""
+        return cache.get_or_set(cls.PUBLISHED_COURSES_CACHE_KEY, lambda: list(cls.objects.filter(course__state="published").distinct()), None)
+
+    @classmethod
+    def invalidate_published_courses_cache(cls):
+        cache.delete(cls.PUBLISHED_COURSES_CACHE_KEY)
+        # the navbars contain the semester menus
+        from evap.evaluation.tools import invalidate_navbar_cache
+        invalidate_navbar_cache()
 
     @classmethod
     def active_semester(cls):
@@ -190,6 +204,18 @@ class CourseType(models.Model, metaclass=LocalizeModelBase):
         return not self.courses.all().exists()
 
 
+class CourseQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Filters the courses which the user can see, see Course.can_user_see_course. Staff users can see all
+        courses, others all courses that are not private and the private ones they participate in or which
+        they or a user they represent contribute to."""
+        if user.is_staff:
+            return self
+        participations = Course.participants.through.objects.filter(userprofile=user).values('course_id')
+        contributions = Contribution.objects.filter(Q(contributor=user) | Q(contributor__delegates=user)).values('course_id')
+        return self.filter(Q(is_private=False) | Q(pk__in=participations) | Q(pk__in=contributions))
+
+
 class Course(models.Model, metaclass=LocalizeModelBase):
     """Models a single course, e.g. the Math 101 course of 2002."""
 
@@ -227,6 +253,11 @@ class Course(models.Model, metaclass=LocalizeModelBase):
     voters = models.ManyToManyField(settings.AUTH_USER_MODEL, verbose_name=_("voters"), blank=True, related_name='courses_voted_for')
     _voter_count = models.IntegerField(verbose_name=_("voter count"), blank=True, null=True, default=None)
 
+    # the current numbers of participants and voters, kept up to date by the m2m_changed handlers below.
+    # the counts above are stored when archiving and for single results, and take precedence.
+    participant_count = models.IntegerField(verbose_name=_("number of participants"), default=0, editable=False)
+    voter_count = models.IntegerField(verbose_name=_("number of voters"), default=0, editable=False)
+
     # when the evaluation takes place
     vote_start_date = models.DateField(verbose_name=_("first day of evaluation"))
     vote_end_date = models.DateField(verbose_name=_("last day of evaluation"))
@@ -237,6 +268,8 @@ class Course(models.Model, metaclass=LocalizeModelBase):
 
     course_evaluated = Signal(providing_args=['request', 'semester'])
 
+    objects = CourseQuerySet.as_manager()
+
     class Meta:
         ordering = ('name_de',)
         unique_together = (
@@ -250,6 +283,11 @@ class Course(models.Model, metaclass=LocalizeModelBase):
         return self.name
 
     def save(self, *args, **kw):
+        if not self._state.adding and not kw.get('force_insert') and kw.get('update_fields') is None:
+            # the participant and voter counts are only changed by the m2m_changed handlers,
+            # so that saving an instance loaded before a vote doesn't reset the counts.
+            kw['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                   if not field.primary_key and field.name not in ['participant_count', 'voter_count']]
         super().save(*args, **kw)
 
         # make sure there is a general contribution
@@ -274,23 +312,32 @@ class Course(models.Model, metaclass=LocalizeModelBase):
 
     @property
     def has_enough_questionnaires(self):
+        # in the staff semester view, self.contributions and their questionnaires are prefetched, therefore use them directly
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.general_contribution and (self.is_single_result or all(contribution.questionnaires.all() for contribution in self.contributions.all()))
         return self.general_contribution and (self.is_single_result or all(self.contributions.annotate(Count('questionnaires')).values_list("questionnaires__count", flat=True)))
 
     def can_user_vote(self, user):
         """Returns whether the user is allowed to vote on this course."""
         return (self.state == "in_evaluation"
             and self.is_in_evaluation_period
-            and user in self.participants.all()
-            and user not in self.voters.all())
+            and self.participants.filter(pk=user.pk).exists()
+            and not self.voters.filter(pk=user.pk).exists())
 
     def can_user_see_course(self, user):
-        if user.is_staff:
-            return True
-        if self.is_user_contributor_or_delegate(user):
-            return True
-        if self.is_private and user not in self.participants.all():
-            return False
-        return True
+        return bool(Course.filter_courses_user_can_see([self], user))
+
+    @classmethod
+    def filter_courses_user_can_see(cls, courses, user):
+        """Returns the given courses which the user can see, keeping their order. Use this for courses which are
+        already loaded and CourseQuerySet.visible_to otherwise. The private courses are checked with a single query."""
+        courses = list(courses)
+        private_course_ids = [course.pk for course in courses if course.is_private]
+        if not private_course_ids or user.is_staff:
+            return courses
+
+        visible_course_ids = set(cls.objects.filter(pk__in=private_course_ids).visible_to(user).values_list('pk', flat=True))
+        return [course for course in courses if not course.is_private or course.pk in visible_course_ids]
 
     def can_user_see_results(self, user):
         if user.is_staff:
@@ -303,12 +350,31 @@ class Course(models.Model, metaclass=LocalizeModelBase):
             return self.can_user_see_course(user)
         return False
 
+    @classmethod
+    def filter_courses_user_can_see_results(cls, courses, user):
+        """Returns the given courses whose results the user can see, keeping their order. Like filter_courses_user_can_see,
+        but for can_user_see_results. The contributions of the user and the represented users are checked with a single query."""
+        courses = list(courses)
+        if user.is_staff:
+            return courses
+
+        courses = [course for course in courses if course.state == 'published']
+        contributed_course_ids = set(Contribution.objects.filter(course__in=courses)
+            .filter(Q(contributor=user) | Q(contributor__in=user.represented_users.all())).values_list('course_id', flat=True))
+        visible_courses = cls.filter_courses_user_can_see([course for course in courses if course.pk not in contributed_course_ids and course.can_publish_grades], user)
+        visible_course_ids = contributed_course_ids | {course.pk for course in visible_courses}
+        return [course for course in courses if course.pk in visible_course_ids]
+
     @property
     def is_single_result(self):
         # early return to save some queries
         if self.vote_start_date != self.vote_end_date:
             return False
 
+        # in the results overview and the staff semester view, self.contributions and their questionnaires are prefetched, therefore use them directly
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            responsible_contribution = next(contribution for contribution in self.contributions.all() if contribution.responsible)
+            return any(questionnaire.name_en == Questionnaire.SINGLE_RESULT_QUESTIONNAIRE_NAME for questionnaire in responsible_contribution.questionnaires.all())
         return self.contributions.get(responsible=True).questionnaires.filter(name_en=Questionnaire.SINGLE_RESULT_QUESTIONNAIRE_NAME).exists()
 
     @property
@@ -323,7 +389,7 @@ class Course(models.Model, metaclass=LocalizeModelBase):
     def can_staff_approve(self):
         return self.state in ['new', 'prepared', 'editor_approved']
 
-    @property
+    @cached_property
     def can_publish_grades(self):
         from evap.evaluation.tools import get_sum_of_answer_counters
         if self.is_single_result:
@@ -373,11 +439,13 @@ class Course(models.Model, metaclass=LocalizeModelBase):
 
     @transition(field=state, source='reviewed', target='published')
     def publish(self):
-        pass
+        # do the import here to prevent a circular import
+        from evap.evaluation.tools import store_published_rating_results
+        store_published_rating_results(self)
 
     @transition(field=state, source='published', target='reviewed')
     def unpublish(self):
-        pass
+        self.published_rating_results.all().delete()
 
     @property
     def student_state(self):
@@ -385,6 +453,8 @@ class Course(models.Model, metaclass=LocalizeModelBase):
 
     @cached_property
     def general_contribution(self):
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            return next((contribution for contribution in self.contributions.all() if contribution.contributor_id is None), None)
         try:
             return self.contributions.get(contributor=None)
         except Contribution.DoesNotExist:
@@ -394,13 +464,35 @@ class Course(models.Model, metaclass=LocalizeModelBase):
     def num_participants(self):
         if self._participant_count is not None:
             return self._participant_count
-        return self.participants.count()
+        return self.participant_count
 
     @cached_property
     def num_voters(self):
         if self._voter_count is not None:
             return self._voter_count
-        return self.voters.count()
+        return self.voter_count
+
+    @classmethod
+    def recalculate_participation_counts(cls, courses=None):
+        """Recalculates the participant and voter counts of the given courses (or all courses) from
+        the participations, e.g. after they were changed without sending m2m_changed signals.
+        Returns the courses whose counts were wrong, with the corrected counts."""
+        courses = cls.objects.all() if courses is None else courses
+        course_ids = [course.pk for course in courses]
+        participant_counts = dict(cls.participants.through.objects.filter(course_id__in=course_ids)
+                                  .values_list('course_id').annotate(Count('id')).order_by())
+        voter_counts = dict(cls.voters.through.objects.filter(course_id__in=course_ids)
+                            .values_list('course_id').annotate(Count('id')).order_by())
+
+        corrected_courses = []
+        for course in cls.objects.filter(pk__in=course_ids):
+            participant_count = participant_counts.get(course.pk, 0)
+            voter_count = voter_counts.get(course.pk, 0)
+            if (course.participant_count, course.voter_count) != (participant_count, voter_count):
+                cls.objects.filter(pk=course.pk).update(participant_count=participant_count, voter_count=voter_count)
+                course.participant_count, course.voter_count = participant_count, voter_count
+                corrected_courses.append(course)
+        return corrected_courses
 
     @property
     def due_participants(self):
@@ -408,6 +500,8 @@ class Course(models.Model, metaclass=LocalizeModelBase):
 
     @cached_property
     def responsible_contributor(self):
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            return next(contribution.contributor for contribution in self.contributions.all() if contribution.responsible)
         return self.contributions.get(responsible=True).contributor
 
     @property
@@ -698,6 +792,45 @@ class RatingAnswerCounter(Answer):
         self.count += 1
 
 
+class RatingAnswerAggregate(models.Model):
+    """Running sums of all rating answers given to a question for a contribution.
+    Updated on each vote, so averages and deviations can be read without
+    looking at the single answer counters."""
+
+    question = models.ForeignKey(Question, models.PROTECT)
+    contribution = models.ForeignKey(Contribution, models.PROTECT, related_name="rating_answer_aggregates")
+
+    total_count = models.IntegerField(verbose_name=_("total count"), default=0)
+    answer_sum = models.IntegerField(verbose_name=_("sum of answers"), default=0)
+    answer_square_sum = models.IntegerField(verbose_name=_("sum of squared answers"), default=0)
+
+    class Meta:
+        unique_together = (
+            ('question', 'contribution'),
+        )
+        verbose_name = _("rating answer aggregate")
+        verbose_name_plural = _("rating answer aggregates")
+
+    def recalculate(self):
+        answer_counters = RatingAnswerCounter.objects.filter(question=self.question, contribution=self.contribution)
+        self.total_count = sum(answer_counter.count for answer_counter in answer_counters)
+        self.answer_sum = sum(answer_counter.answer * answer_counter.count for answer_counter in answer_counters)
+        self.answer_square_sum = sum(answer_counter.answer ** 2 * answer_counter.count for answer_counter in answer_counters)
+
+    @property
+    def average(self):
+        if self.total_count == 0:
+            return None
+        return self.answer_sum / self.total_count
+
+    @property
+    def deviation(self):
+        if self.total_count == 0:
+            return None
+        # clamp at zero as rounding errors can lead to slightly negative variances
+        return sqrt(max(self.answer_square_sum / self.total_count - self.average ** 2, 0))
+
+
 class TextAnswer(Answer):
     """A free-form text answer to a question (usually a comment about a course
     or a contributor)."""
@@ -759,6 +892,40 @@ class TextAnswer(Answer):
         self.state = self.NOT_REVIEWED
 
 
+class PublishedRatingResult(models.Model):
+    """The materialized result of a rating question for one contribution of a
+    published course. Written when the course gets published and deleted when
+    it gets unpublished, so aggregated numbers can be read without recalculating
+    them from the answer counters."""
+
+    course = models.ForeignKey(Course, models.CASCADE, related_name="published_rating_results")
+    contribution = models.ForeignKey(Contribution, models.CASCADE, related_name="published_rating_results")
+    question = models.ForeignKey(Question, models.CASCADE, related_name="published_rating_results")
+
+    total_count = models.IntegerField(verbose_name=_("total count"))
+    average = models.FloatField(verbose_name=_("average"), blank=True, null=True)
+    deviation = models.FloatField(verbose_name=_("deviation"), blank=True, null=True)
+    warning = models.BooleanField(verbose_name=_("warning"), default=False)
+
+    # the number of answers per possible rating
+    count_1 = models.IntegerField(default=0)
+    count_2 = models.IntegerField(default=0)
+    count_3 = models.IntegerField(default=0)
+    count_4 = models.IntegerField(default=0)
+    count_5 = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            ('contribution', 'question'),
+        )
+        verbose_name = _("published rating result")
+        verbose_name_plural = _("published rating results")
+
+    @property
+    def counts(self):
+        return OrderedDict((answer, getattr(self, "count_{}".format(answer))) for answer in range(1, 6))
+
+
 class FaqSection(models.Model, metaclass=LocalizeModelBase):
     """Section in the frequently asked questions"""
 
@@ -901,13 +1068,81 @@ class UserProfile(AbstractBaseUser, PermissionsMixin):
     def is_active(self):
         return True
 
+    ROLES_CACHE_VERSION_KEY = 'evap.evaluation.cache_versions.user_roles'
+    ROLES_CACHE_TIMEOUT = 24 * 60 * 60
+
+    @classmethod
+    def get_roles_cache_key(cls, user_id):
+        return 'evap.evaluation.models.user_roles-{:d}'.format(user_id)
+
+    @cached_property
+    def roles(self):
+        """
+            Returns a dict containing the role flags of this user, e.g. "is_participant". They are cached across
+            requests and on this instance, so they are computed at most once per request for request.user. The
+            cached flags are invalidated by signals when contributions, participations, delegations or groups
+            change. Call invalidate_roles after changing them in ways that don't send signals.
+        """
+        if self.pk is None:
+            return dict.fromkeys(['is_participant', 'is_contributor', 'is_editor', 'is_responsible', 'is_delegate', 'is_staff', 'is_grade_publisher'], False)
+
+        # do the import here to prevent a circular import
+        from evap.evaluation.tools import get_cache_version
+
+        # the snapshot stores the version it was computed for, so that both can be fetched at once
+        cache_key = self.get_roles_cache_key(self.pk)
+        cached = cache.get_many([self.ROLES_CACHE_VERSION_KEY, cache_key])
+        version = cached[self.ROLES_CACHE_VERSION_KEY] if self.ROLES_CACHE_VERSION_KEY in cached else get_cache_version(self.ROLES_CACHE_VERSION_KEY)
+        if cache_key in cached and cached[cache_key][0] == version:
+            return cached[cache_key][1]
+
+        roles = self._calculate_roles()
+        cache.set(cache_key, (version, roles), self.ROLES_CACHE_TIMEOUT)
+        return roles
+
+    def _calculate_roles(self):
+        """Computes the role flags with a single query."""
+        def count(relation, **conditions):
+            # the joins multiply the rows, therefore only distinct related objects are counted
+            if conditions:
+                relation = Case(When(then=relation, **conditions))
+            return Count(relation, distinct=True)
+
+        counts = UserProfile.objects.filter(pk=self.pk).aggregate(
+            is_participant=count('courses_participating_in'),
+            is_contributor=count('contributions'),
+            is_editor=count('contributions', contributions__can_edit=True),
+            is_responsible=count('contributions', contributions__responsible=True),
+            is_delegate=count('represented_users'),
+            is_staff=count('groups', groups__name='Staff'),
+            is_grade_publisher=count('groups', groups__name='Grade publisher'),
+        )
+        return {role: number > 0 for role, number in counts.items()}
+
+    def invalidate_roles(self):
+        for attribute in ['roles', 'is_staff', 'is_grade_publisher']:
+            self.__dict__.pop(attribute, None)
+        if self.pk is not None:
+            UserProfile.invalidate_cached_roles([self.pk])
+
+    @classmethod
+    def invalidate_cached_roles(cls, user_ids=None):
+        """Removes the cached role flags of the given users. If no users are given, those of all users are
+        invalidated at once by incrementing the version of the cached flags."""
+        if user_ids is None:
+            from evap.evaluation.tools import increment_cache_version
+            increment_cache_version(cls.ROLES_CACHE_VERSION_KEY)
+        else:
+            cache.delete_many([cls.get_roles_cache_key(user_id) for user_id in user_ids])
+
+    # is_staff and is_grade_publisher are cached properties because they are set by annotations in the user list
     @cached_property
     def is_staff(self):
-        return self.groups.filter(name='Staff').exists()
+        return self.roles['is_staff']
 
     @cached_property
     def is_grade_publisher(self):
-        return self.groups.filter(name='Grade publisher').exists()
+        return self.roles['is_grade_publisher']
 
     @property
     def can_staff_delete(self):
@@ -924,7 +1159,7 @@ class UserProfile(AbstractBaseUser, PermissionsMixin):
 
     @property
     def is_participant(self):
-        return self.courses_participating_in.exists()
+        return self.roles['is_participant']
 
     @property
     def is_student(self):
@@ -945,20 +1180,25 @@ class UserProfile(AbstractBaseUser, PermissionsMixin):
 
     @property
     def is_contributor(self):
-        return self.contributions.exists()
+        # in the user list, self.user.contributions is prefetched, therefore use it directly instead of querying the roles
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            return len(self.contributions.all()) > 0
+        return self.roles['is_contributor']
 
     @property
     def is_editor(self):
-        return self.contributions.filter(can_edit=True).exists()
+        return self.roles['is_editor']
 
     @property
     def is_responsible(self):
-        # in the user list, self.user.contributions is prefetched, therefore use it directly and don't filter it
-        return any(contribution.responsible for contribution in self.contributions.all())
+        # in the user list, self.user.contributions is prefetched, therefore use it directly instead of querying the roles
+        if 'contributions' in getattr(self, '_prefetched_objects_cache', {}):
+            return any(contribution.responsible for contribution in self.contributions.all())
+        return self.roles['is_responsible']
 
     @property
     def is_delegate(self):
-        return self.represented_users.exists()
+        return self.roles['is_delegate']
 
     @property
     def is_editor_or_delegate(self):
@@ -1019,6 +1259,166 @@ class UserProfile(AbstractBaseUser, PermissionsMixin):
         return self.courses_voted_for.order_by('semester__created_at', 'name_de')
 
 
+@receiver(models.signals.post_save, sender=Contribution)
+@receiver(models.signals.post_delete, sender=Contribution)
+def invalidate_contributor_roles(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is models.signals.post_save and not created:
+        # the contributor might have been changed, and the previous one is not known anymore
+        UserProfile.invalidate_cached_roles()
+    elif instance.contributor_id is not None:
+        UserProfile.invalidate_cached_roles([instance.contributor_id])
+
+
+@receiver(models.signals.post_delete, sender=Course)
+def invalidate_participant_roles(sender, instance, **kwargs):
+    # the participations are deleted without sending signals
+    UserProfile.invalidate_cached_roles()
+
+
+@receiver(post_transition, sender=Course)
+def mark_published_state_changed(sender, instance, name, **kwargs):
+    if name in ['publish', 'unpublish']:
+        # the cached semesters are invalidated as soon as the new state is saved
+        instance._published_state_changed = True
+
+
+@receiver(models.signals.post_save, sender=Course)
+@receiver(models.signals.post_delete, sender=Course)
+def invalidate_semesters_with_published_courses(sender, instance, created=False, **kwargs):
+    published_state_changed = instance.__dict__.pop('_published_state_changed', False)
+    if kwargs['signal'] is models.signals.post_save and not created:
+        if published_state_changed:
+            Semester.invalidate_published_courses_cache()
+    elif instance.state == 'published':
+        Semester.invalidate_published_courses_cache()
+
+
+@receiver(models.signals.post_save, sender=Course)
+@receiver(models.signals.post_delete, sender=Course)
+def invalidate_student_dashboards_of_course(sender, instance, created=False, **kwargs):
+    from evap.evaluation.tools import invalidate_student_dashboards
+    if kwargs['signal'] is models.signals.post_delete:
+        # the participations are deleted without sending signals
+        invalidate_student_dashboards()
+    elif not created:
+        invalidate_student_dashboards(instance.participants.values_list('pk', flat=True))
+
+
+@receiver(models.signals.post_save, sender=Semester)
+@receiver(models.signals.post_delete, sender=Semester)
+def invalidate_semester_caches(sender, **kwargs):
+    from evap.evaluation.tools import invalidate_student_dashboards
+    Semester.invalidate_published_courses_cache()
+    invalidate_student_dashboards()
+
+
+@receiver(models.signals.post_save, sender=CourseType)
+@receiver(models.signals.post_delete, sender=CourseType)
+def invalidate_student_dashboards_of_course_type(sender, **kwargs):
+    from evap.evaluation.tools import invalidate_student_dashboards
+    invalidate_student_dashboards()
+
+
+@receiver(models.signals.m2m_changed, sender=Course.participants.through)
+@receiver(models.signals.m2m_changed, sender=UserProfile.groups.through)
+@receiver(models.signals.m2m_changed, sender=UserProfile.delegates.through)
+def invalidate_roles_of_changed_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    # the affected users are the participants, the members of the groups and the delegates.
+    # groups and delegates are fields of UserProfile, participants one of Course.
+    users_are_instances = (sender is UserProfile.groups.through) != reverse
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if users_are_instances:
+        UserProfile.invalidate_cached_roles([instance.pk])
+    elif action == 'post_clear':
+        UserProfile.invalidate_cached_roles()
+    else:
+        UserProfile.invalidate_cached_roles(pk_set)
+
+
+@receiver(models.signals.m2m_changed, sender=Course.participants.through)
+@receiver(models.signals.m2m_changed, sender=Course.voters.through)
+def update_participation_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    count_field = 'participant_count' if sender is Course.participants.through else 'voter_count'
+    # the changed participations are determined before removing them, as pk_set might contain ids that weren't related at all
+    if action in ['pre_remove', 'pre_clear']:
+        participations = sender.objects.filter(userprofile=instance) if reverse else sender.objects.filter(course=instance)
+        if action == 'pre_remove':
+            participations = participations.filter(**{'course__in' if reverse else 'userprofile__in': pk_set})
+        instance._removed_participations = list(participations.values_list('course_id', flat=True))
+        return
+    if action == 'post_add':
+        course_ids = list(pk_set) if reverse else [instance.pk] * len(pk_set)
+        delta = 1
+    elif action in ['post_remove', 'post_clear']:
+        course_ids = instance.__dict__.pop('_removed_participations', [])
+        delta = -1
+    else:
+        return
+
+    # the counts are changed relatively, so that concurrent votes can't overwrite each other
+    course_ids_by_change = defaultdict(list)
+    for course_id, change in Counter(course_ids).items():
+        course_ids_by_change[change * delta].append(course_id)
+    for change, changed_course_ids in course_ids_by_change.items():
+        Course.objects.filter(pk__in=changed_course_ids).update(**{count_field: F(count_field) + change})
+
+    if not reverse:
+        setattr(instance, count_field, Course.objects.values_list(count_field, flat=True).get(pk=instance.pk))
+        instance.__dict__.pop('num_participants' if count_field == 'participant_count' else 'num_voters', None)
+
+
+@receiver(models.signals.pre_delete, sender=UserProfile)
+def update_participation_counts_of_deleted_user(sender, instance, **kwargs):
+    # the participations are deleted together with the user without sending m2m_changed
+    Course.objects.filter(participants=instance).update(participant_count=F('participant_count') - 1)
+    Course.objects.filter(voters=instance).update(voter_count=F('voter_count') - 1)
+
+
+@receiver(models.signals.m2m_changed, sender=Course.participants.through)
+@receiver(models.signals.m2m_changed, sender=Course.voters.through)
+def invalidate_student_dashboards_of_changed_participations(sender, instance, action, reverse, pk_set, **kwargs):
+    from evap.evaluation.tools import invalidate_student_dashboards
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if reverse:
+        invalidate_student_dashboards([instance.pk])
+    elif action == 'post_clear':
+        invalidate_student_dashboards()
+    else:
+        invalidate_student_dashboards(pk_set)
+
+
+@receiver(models.signals.m2m_changed, sender=Course.voters.through)
+def invalidate_statistics_of_changed_voters(sender, instance, action, reverse, pk_set, **kwargs):
+    # votes create their text answers without sending signals
+    from evap.evaluation.tools import invalidate_semester_statistics
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            invalidate_semester_statistics([instance.semester_id])
+    elif action == 'pre_clear':
+        # the instance is a user whose courses are not known anymore after clearing them
+        instance._cleared_semester_ids = list(sender.objects.filter(userprofile=instance).values_list('course__semester_id', flat=True))
+    elif action == 'post_clear':
+        invalidate_semester_statistics(instance.__dict__.pop('_cleared_semester_ids', []))
+    elif action in ['post_add', 'post_remove']:
+        invalidate_semester_statistics(Course.objects.filter(pk__in=pk_set).values_list('semester_id', flat=True))
+
+
+@receiver(models.signals.post_save, sender=Question)
+@receiver(models.signals.post_delete, sender=Question)
+def invalidate_questions_of_changed_question(sender, instance, **kwargs):
+    from evap.evaluation.tools import invalidate_questions_cache
+    invalidate_questions_cache([instance.questionnaire_id])
+
+
+@receiver(models.signals.post_save, sender=TextAnswer)
+def invalidate_statistics_of_changed_textanswer(sender, instance, **kwargs):
+    # text answers are only deleted together with their course, whose statistics are not shown anymore then
+    from evap.evaluation.tools import invalidate_semester_statistics
+    invalidate_semester_statistics(Course.objects.filter(contributions=instance.contribution_id).values_list('semester_id', flat=True))
+
+
 def validate_template(value):
     """Field validator which ensures that the value can be compiled into a
     Django Template."""
@@ -5,12 +5,14 @@ from unittest.mock import patch
 from django.conf import settings
 from io import StringIO
 from django.core import management, mail
+from django.core.cache import cache, caches
 from django.test import TestCase
 from django.test.utils import override_settings
 
 from model_mommy import mommy
 
-from evap.evaluation.models import UserProfile, Course, Semester
+from evap.evaluation.models import UserProfile, Course, Semester, RatingAnswerCounter, RatingAnswerAggregate, PublishedRatingResult
+from evap.evaluation.tools import get_results_cache_key
 
 
 class TestAnonymizeCommand(TestCase):
@@ -53,17 +55,63 @@ class TestReloadTestdataCommand(TestCase):
         mock_call_command.assert_any_call('migrate')
         mock_call_command.assert_any_call('createcachetable')
         mock_call_command.assert_any_call('loaddata', 'test_data')
+        mock_call_command.assert_any_call('recalculate_participation_counts')
+        self.assertEqual(mock_call_command.call_count, 5)
 
-        self.assertEqual(mock_call_command.call_count, 4)
+
+class TestClearCachesCommand(TestCase):
+    def test_clears_only_the_given_caches(self):
+        caches['shared'].set('key', 'value')
+        caches['results'].set('key', 'value')
+
+        management.call_command('clear_caches', 'shared', stdout=StringIO())
+
+        self.assertIsNone(caches['shared'].get('key'))
+        self.assertEqual(caches['results'].get('key'), 'value')
 
 
 class TestRefreshResultsCacheCommand(TestCase):
-    def test_calls_calculate_results(self):
-        mommy.make(Course)
-        with patch('evap.evaluation.tools.calculate_results') as mock:
+    def test_caches_results_of_published_courses(self):
+        published_course = mommy.make(Course, state='published')
+        unpublished_course = mommy.make(Course, state='evaluated')
+
+        management.call_command('refresh_results_cache', stdout=StringIO())
+
+        self.assertIsNotNone(cache.get(get_results_cache_key(published_course)))
+        self.assertIsNone(cache.get(get_results_cache_key(unpublished_course)))
+
+    def test_semester_filter(self):
+        course = mommy.make(Course, state='published')
+        other_course = mommy.make(Course, state='published')
+
+        management.call_command('refresh_results_cache', semesters=[course.semester.pk], stdout=StringIO())
+
+        self.assertIsNotNone(cache.get(get_results_cache_key(course)))
+        self.assertIsNone(cache.get(get_results_cache_key(other_course)))
+
+    def test_only_missing(self):
+        mommy.make(Course, state='published')
+        management.call_command('refresh_results_cache', stdout=StringIO())
+
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            management.call_command('refresh_results_cache', only_missing=True, stdout=StringIO())
+        self.assertEqual(mock.call_count, 0)
+
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
             management.call_command('refresh_results_cache', stdout=StringIO())
+        self.assertEqual(mock.call_count, 1)
+
 
-        self.assertEqual(mock.call_count, Course.objects.count())
+class TestRecalculateParticipationCountsCommand(TestCase):
+    def test_corrects_counts(self):
+        course = mommy.make(Course)
+        Course.voters.through.objects.create(course=course, userprofile=mommy.make(UserProfile))
+
+        output = StringIO()
+        management.call_command('recalculate_participation_counts', stdout=output)
+
+        self.assertEqual(Course.objects.get(pk=course.pk).num_voters, 1)
+        self.assertIn("1 course(s) had wrong participant or voter counts.", output.getvalue())
 
 
 class TestUpdateCourseStatesCommand(TestCase):
@@ -138,3 +186,64 @@ class TestSendRemindersCommand(TestCase):
 
         self.assertEqual(mock.call_count, 0)
         self.assertEqual(len(mail.outbox), 0)
+
+
+class TestBenchmarkVotesCommand(TestCase):
+    def test_votes_are_submitted_and_data_is_deleted(self):
+        output = StringIO()
+        management.call_command('benchmark_votes', courses=2, participants=3, contributors=2, questions=3, interactive=False, stdout=output)
+
+        self.assertIn("Votes: 6", output.getvalue())
+        self.assertIn("votes/s", output.getvalue())
+        self.assertFalse(Semester.objects.exists())
+        self.assertFalse(UserProfile.objects.exists())
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_votes_are_submitted_with_allowed_host(self):
+        # the test runner allows all hosts, unlike the dev and production settings
+        management.call_command('benchmark_votes', courses=1, participants=2, contributors=1, questions=3, keep=True, interactive=False, stdout=StringIO())
+
+        self.assertEqual(Course.objects.get().voters.count(), 2)
+
+    def test_failed_vote_raises_error(self):
+        with patch('evap.evaluation.management.commands.benchmark_votes.Client.post') as mock:
+            mock.return_value.status_code = 400
+            with self.assertRaises(management.CommandError):
+                management.call_command('benchmark_votes', courses=1, participants=2, contributors=1, questions=3, interactive=False, stdout=StringIO())
+
+        self.assertFalse(Semester.objects.exists())
+
+    def test_keep_data(self):
+        management.call_command('benchmark_votes', courses=1, participants=2, contributors=1, questions=3, keep=True, interactive=False, stdout=StringIO())
+
+        course = Course.objects.get()
+        self.assertEqual(course.voters.count(), 2)
+
+
+class TestGenerateDataCommand(TestCase):
+    def test_data_is_generated(self):
+        output = StringIO()
+        management.call_command('generate_data', semesters=2, courses=10, students=100, contributors=10, participants=20, questions=4,
+                                interactive=False, stdout=output)
+
+        self.assertIn("Done", output.getvalue())
+        self.assertEqual(Semester.objects.count(), 2)
+        self.assertEqual(Course.objects.count(), 20)
+        self.assertEqual(UserProfile.objects.count(), 110)
+        for course in Course.objects.all():
+            self.assertIsNotNone(course.general_contribution)
+            self.assertTrue(course.contributions.get(responsible=True).can_edit)
+            self.assertTrue(set(course.voters.all()) <= set(course.participants.all()))
+        self.assertTrue(RatingAnswerCounter.objects.exists())
+        self.assertTrue(PublishedRatingResult.objects.exists())
+        self.assertEqual(RatingAnswerAggregate.objects.count(), RatingAnswerCounter.objects.values("contribution", "question").distinct().count())
+
+    def test_is_deterministic(self):
+        def generate():
+            management.call_command('generate_data', semesters=1, courses=5, students=30, contributors=5, interactive=False, stdout=StringIO())
+            return list(RatingAnswerCounter.objects.order_by("id").values_list("question__order", "answer", "count"))
+
+        first_answers = generate()
+        for model in [RatingAnswerCounter, RatingAnswerAggregate]:
+            model.objects.all().delete()
+        self.assertEqual(first_answers, generate())
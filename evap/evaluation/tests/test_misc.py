@@ -1,16 +1,23 @@
 import os.path
 from io import StringIO
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import MiddlewareNotUsed
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.test.utils import override_settings
 
 from model_mommy import mommy
 
+from evap.evaluation.cache_backends import TwoTierCache
+from evap.evaluation.instrumentation import RequestInstrumentationMiddleware, get_request_statistics, reset_request_statistics
 from evap.evaluation.models import Semester, UserProfile, CourseType
 from evap.evaluation.tests.tools import WebTest
+from evap.evaluation.tools import NAVBAR_CACHE_VERSION_KEY, STUDENT_DASHBOARD_CACHE_VERSION_KEY, get_student_dashboard_cache_key
 
 
 @override_settings(INSTITUTION_EMAIL_DOMAINS=["institution.com", "student.institution.com"])
@@ -72,3 +79,129 @@ class TestMissingMigrations(TestCase):
             self.assertEqual(str(e), '1')
         else:
             self.fail("There are missing migrations:\n %s" % output.getvalue())
+
+
+class TestRequestInstrumentationMiddleware(WebTest):
+
+    @classmethod
+    def setUpTestData(cls):
+        mommy.make(UserProfile, username="staff", groups=[Group.objects.get(name="Staff")])
+
+    def setUp(self):
+        reset_request_statistics()
+
+    @override_settings(REQUEST_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_nothing_is_recorded_without_sampling(self):
+        self.app.get("/staff/", user="staff")
+
+        self.assertEqual(get_request_statistics(), [])
+
+    @override_settings(REQUEST_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_middleware_is_not_used_without_sampling(self):
+        with patch('evap.evaluation.instrumentation.install_hooks') as mock:
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestInstrumentationMiddleware()
+        self.assertFalse(mock.called)
+
+    @override_settings(REQUEST_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_requests_are_recorded_per_url_name(self):
+        self.app.get("/staff/", user="staff")
+        self.app.get("/staff/", user="staff")
+        self.app.get("/staff/degrees/", user="staff")
+
+        statistics = {entry["url_name"]: entry for entry in get_request_statistics()}
+        self.assertEqual(set(statistics), {"staff:index", "staff:degree_index"})
+        self.assertEqual(statistics["staff:index"]["requests"], 2)
+        self.assertGreater(statistics["staff:index"]["queries"], 0)
+        self.assertGreater(statistics["staff:index"]["template_time"], 0)
+        self.assertGreaterEqual(statistics["staff:index"]["time"], statistics["staff:index"]["template_time"])
+        # the navbar is cached, so the first request misses and the second one hits the cache
+        self.assertGreater(statistics["staff:index"]["cache_hits"], 0)
+        self.assertGreater(statistics["staff:index"]["cache_misses"], 0)
+
+    @override_settings(REQUEST_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_statistics_page_and_export(self):
+        self.app.get("/staff/degrees/", user="staff")
+
+        page = self.app.get("/staff/request_statistics/", user="staff")
+        self.assertIn("staff:degree_index", page)
+
+        export = self.app.get("/staff/request_statistics/export", user="staff")
+        self.assertIn("staff:degree_index;1;", export.text)
+
+        page.forms[2].submit()
+        # only the reset request itself is recorded after resetting
+        self.assertEqual([entry["url_name"] for entry in get_request_statistics()], ["staff:request_statistics"])
+
+
+# local memory caches are the stand-ins for the shared caches here
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared', 'OPTIONS': {'MAX_ENTRIES': 10}},
+    'results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-results'},
+})
+class TestTwoTierCache(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        caches['results'].clear()
+
+    def make_cache(self, max_local_bytes=10000):
+        return TwoTierCache(self.id(), {'OPTIONS': {
+            'DEFAULT_BACKEND': 'shared',
+            'NAMESPACES': [('results-', 'results', True)],
+            'MAX_LOCAL_BYTES': max_local_bytes,
+        }})
+
+    def test_keys_are_routed_by_namespace(self):
+        cache = self.make_cache()
+        cache.set('results-1', 'result')
+        cache.set_many({'fragment-{}'.format(i): 'fragment' for i in range(100)})
+
+        self.assertEqual(caches['results'].get('results-1'), 'result')
+        self.assertIsNone(caches['shared'].get('results-1'))
+        # the fragments are culled in their own cache only
+        self.assertLess(len(cache.get_many(['fragment-{}'.format(i) for i in range(100)])), 100)
+        self.assertEqual(cache.get_many(['results-1', 'fragment-99']), {'results-1': 'result', 'fragment-99': 'fragment'})
+
+        cache.clear()
+        self.assertIsNone(caches['results'].get('results-1'))
+
+    def test_local_tier_is_used_for_selected_namespaces_only(self):
+        cache = self.make_cache()
+        cache.set('results-1', 'result')
+        cache.set('version', 1)
+        # simulates another process changing the entries
+        caches['results'].delete('results-1')
+        caches['shared'].set('version', 2)
+
+        self.assertEqual(cache.get('results-1'), 'result')
+        self.assertEqual(cache.get('version'), 2)
+
+        cache.delete('results-1')
+        self.assertIsNone(cache.get('results-1'))
+
+    def test_local_tier_is_bounded_in_bytes(self):
+        cache = self.make_cache(max_local_bytes=2500)
+        for i in range(3):
+            cache.set('results-{}'.format(i), 'x' * 1000)
+        # the least recently used entry was evicted from the local tier
+        caches['results'].clear()
+        self.assertEqual(cache.get_many(['results-0', 'results-1', 'results-2']), {'results-1': 'x' * 1000, 'results-2': 'x' * 1000})
+        self.assertLessEqual(cache.local_tier.size, 2500)
+
+    def test_local_tier_can_be_disabled(self):
+        cache = self.make_cache(max_local_bytes=0)
+        cache.set('results-1', 'result')
+        caches['results'].delete('results-1')
+        self.assertIsNone(cache.get('results-1'))
+
+
+class TestCacheConfiguration(SimpleTestCase):
+
+    def test_entries_are_routed_to_sized_caches(self):
+        cache = caches['default']
+        for key in [UserProfile.ROLES_CACHE_VERSION_KEY, STUDENT_DASHBOARD_CACHE_VERSION_KEY, NAVBAR_CACHE_VERSION_KEY]:
+            self.assertIs(cache.get_backend(key)[0], caches['versions'])
+        for key in [UserProfile.get_roles_cache_key(1), get_student_dashboard_cache_key(1), make_template_fragment_key('navbar', [1, 'user', 'en'])]:
+            self.assertIs(cache.get_backend(key)[0], caches['users'])
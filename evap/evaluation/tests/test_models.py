@@ -1,6 +1,7 @@
 from datetime import date, timedelta
 from unittest.mock import patch, Mock
 
+from django.contrib.auth.models import Group
 from django.test import TestCase
 from django.core.cache import cache
 from django.core import mail
@@ -82,6 +83,114 @@ class TestCourses(TestCase):
         responsible_contribution.questionnaires.add(questionnaire)
         self.assertTrue(course.has_enough_questionnaires)
 
+    def test_participation_counts_are_updated(self):
+        course = mommy.make(Course)
+        users = mommy.make(UserProfile, _quantity=3)
+
+        course.participants = users
+        course.voters.add(users[0], users[1])
+        self.assertEqual((course.num_participants, course.num_voters), (3, 2))
+
+        users[2].courses_participating_in.clear()
+        users[1].courses_voted_for.remove(course)
+        # removing users that are not related does not change the counts
+        course.voters.remove(users[2])
+        course = Course.objects.get(pk=course.pk)
+        self.assertEqual((course.num_participants, course.num_voters), (2, 1))
+
+        course.voters.clear()
+        course = Course.objects.get(pk=course.pk)
+        self.assertEqual((course.num_participants, course.num_voters), (2, 0))
+
+    def test_saving_outdated_course_keeps_participation_counts(self):
+        course = mommy.make(Course)
+        outdated_course = Course.objects.get(pk=course.pk)
+        course.participants.add(mommy.make(UserProfile))
+
+        outdated_course.save()
+        self.assertEqual(Course.objects.get(pk=course.pk).num_participants, 1)
+
+    def test_deleting_user_updates_participation_counts(self):
+        users = mommy.make(UserProfile, _quantity=2)
+        course = mommy.make(Course, participants=users, voters=users)
+        other_course = mommy.make(Course, participants=[users[0]])
+
+        users[0].delete()
+        course = Course.objects.get(pk=course.pk)
+        self.assertEqual((course.num_participants, course.num_voters), (1, 1))
+        self.assertEqual(Course.objects.get(pk=other_course.pk).num_participants, 0)
+
+    def test_recalculate_participation_counts(self):
+        course = mommy.make(Course)
+        Course.participants.through.objects.create(course=course, userprofile=mommy.make(UserProfile))
+        self.assertEqual(Course.objects.get(pk=course.pk).num_participants, 0)
+
+        self.assertEqual(Course.recalculate_participation_counts(), [course])
+        self.assertEqual(Course.objects.get(pk=course.pk).num_participants, 1)
+        self.assertEqual(Course.recalculate_participation_counts(), [])
+
+    def test_can_user_vote(self):
+        participant, voter = mommy.make(UserProfile, _quantity=2)
+        course = mommy.make(Course, state='in_evaluation', participants=[participant, voter], voters=[voter],
+                            vote_start_date=date.today(), vote_end_date=date.today())
+
+        self.assertTrue(course.can_user_vote(participant))
+        self.assertFalse(course.can_user_vote(voter))
+        self.assertFalse(course.can_user_vote(mommy.make(UserProfile)))
+
+    def test_filter_courses_user_can_see(self):
+        user, contributor = mommy.make(UserProfile, _quantity=2)
+        contributor.delegates = [user]
+        public_course = mommy.make(Course)
+        private_courses = mommy.make(Course, is_private=True, _quantity=4)
+        private_courses[0].participants = [user]
+        mommy.make(Contribution, course=private_courses[1], contributor=user)
+        mommy.make(Contribution, course=private_courses[2], contributor=contributor)
+        courses = [private_courses[3], public_course] + private_courses[:3]
+
+        self.assertFalse(user.is_staff)
+        with self.assertNumQueries(1):
+            self.assertEqual(Course.filter_courses_user_can_see(courses, user), [public_course] + private_courses[:3])
+        self.assertFalse(private_courses[3].can_user_see_course(user))
+        self.assertTrue(private_courses[2].can_user_see_course(user))
+
+        staff_user = mommy.make(UserProfile, groups=[Group.objects.get(name='Staff')])
+        self.assertEqual(Course.filter_courses_user_can_see(courses, staff_user), courses)
+
+    def test_filter_courses_user_can_see_results(self):
+        user, contributor = mommy.make(UserProfile, _quantity=2)
+        contributor.delegates = [user]
+        dates = dict(vote_start_date=date.today() - timedelta(days=1), vote_end_date=date.today())
+        enough_answers_course = mommy.make(Course, state='published', _participant_count=10, _voter_count=10, **dates)
+        unpublished_course = mommy.make(Course, state='reviewed', _participant_count=10, _voter_count=10, **dates)
+        few_answers_courses = mommy.make(Course, state='published', _participant_count=10, _voter_count=0, _quantity=3, **dates)
+        mommy.make(Contribution, course=few_answers_courses[1], contributor=user)
+        mommy.make(Contribution, course=few_answers_courses[2], contributor=contributor)
+        courses = [unpublished_course, few_answers_courses[0], enough_answers_course] + few_answers_courses[1:]
+
+        self.assertFalse(user.is_staff)
+        self.assertEqual(Course.filter_courses_user_can_see_results(courses, user), [enough_answers_course] + few_answers_courses[1:])
+        self.assertEqual(Course.filter_courses_user_can_see_results(courses, user), [course for course in courses if course.can_user_see_results(user)])
+
+        staff_user = mommy.make(UserProfile, groups=[Group.objects.get(name='Staff')])
+        self.assertEqual(Course.filter_courses_user_can_see_results(courses, staff_user), courses)
+
+    def test_visible_to(self):
+        user, contributor = mommy.make(UserProfile, _quantity=2)
+        contributor.delegates = [user]
+        public_course = mommy.make(Course)
+        private_courses = mommy.make(Course, is_private=True, _quantity=4)
+        private_courses[0].participants = [user]
+        mommy.make(Contribution, course=private_courses[1], contributor=user)
+        mommy.make(Contribution, course=private_courses[2], contributor=contributor)
+
+        self.assertFalse(user.is_staff)
+        with self.assertNumQueries(1):
+            self.assertEqual(set(Course.objects.visible_to(user)), {public_course} | set(private_courses[:3]))
+
+        staff_user = mommy.make(UserProfile, groups=[Group.objects.get(name='Staff')])
+        self.assertEqual(set(Course.objects.visible_to(staff_user)), {public_course} | set(private_courses))
+
     def test_deleting_last_modified_user_does_not_delete_course(self):
         user = mommy.make(UserProfile)
         course = mommy.make(Course, last_modified_user=user)
@@ -89,6 +198,42 @@ class TestCourses(TestCase):
         self.assertTrue(Course.objects.filter(pk=course.pk).exists())
 
 
+class TestSemesterWithPublishedCourses(TestCase):
+
+    def test_is_cached(self):
+        semester = mommy.make(Semester)
+        mommy.make(Course, semester=semester, state='published', _quantity=2)
+        mommy.make(Course, semester=mommy.make(Semester), state='reviewed')
+
+        semesters = Semester.get_all_with_published_courses()
+        self.assertEqual(semesters, [semester])
+
+        with self.assertNumQueries(1):  # the database cache
+            self.assertEqual(Semester.get_all_with_published_courses(), [semester])
+
+    def test_is_invalidated_by_publishing_and_unpublishing(self):
+        course = mommy.make(Course, state='reviewed')
+        self.assertEqual(Semester.get_all_with_published_courses(), [])
+
+        course.publish()
+        self.assertEqual(Semester.get_all_with_published_courses(), [])  # not saved yet
+        course.save()
+        self.assertEqual(Semester.get_all_with_published_courses(), [course.semester])
+
+        course.unpublish()
+        course.save()
+        self.assertEqual(Semester.get_all_with_published_courses(), [])
+
+    def test_is_invalidated_by_changed_semesters(self):
+        semester = mommy.make(Semester, name_en="old name")
+        mommy.make(Course, semester=semester, state='published')
+        Semester.get_all_with_published_courses()
+
+        semester.name_en = "new name"
+        semester.save()
+        self.assertEqual(Semester.get_all_with_published_courses()[0].name_en, "new name")
+
+
 class TestUserProfile(TestCase):
 
     def test_is_student(self):
@@ -133,6 +278,99 @@ class TestUserProfile(TestCase):
         mommy.make(Contribution, contributor=contributor)
         self.assertFalse(contributor.can_staff_delete)
 
+    def test_roles_are_computed_with_a_single_query(self):
+        user = mommy.make(UserProfile, groups=[Group.objects.get(name="Staff")])
+        mommy.make(Course, participants=[user])
+        mommy.make(Course, participants=[user])
+        mommy.make(Contribution, contributor=user, can_edit=False, responsible=False, _quantity=2)
+        mommy.make(UserProfile, delegates=[user])
+
+        with self.assertNumQueries(1):
+            roles = user._calculate_roles()
+        self.assertEqual(roles, dict(is_participant=True, is_contributor=True, is_editor=False, is_responsible=False, is_delegate=True,
+                                     is_staff=True, is_grade_publisher=False))
+
+    def test_roles_are_cached_across_instances(self):
+        user = mommy.make(UserProfile, groups=[Group.objects.get(name="Staff")])
+        self.assertTrue(user.is_staff)
+
+        user = UserProfile.objects.get(pk=user.pk)
+        with patch.object(UserProfile, '_calculate_roles') as mock:
+            self.assertTrue(user.is_staff)
+            self.assertFalse(user.is_participant)
+            self.assertFalse(user.is_editor_or_delegate)
+        self.assertFalse(mock.called)
+
+    def test_invalidate_roles(self):
+        user = mommy.make(UserProfile)
+        self.assertFalse(user.is_editor)
+        self.assertFalse(user.is_staff)
+
+        Contribution.objects.bulk_create([mommy.prepare(Contribution, contributor=user, can_edit=True, course=mommy.make(Course))])
+        self.assertFalse(user.is_editor)
+
+        user.invalidate_roles()
+        self.assertTrue(user.is_editor)
+        self.assertTrue(UserProfile.objects.get(pk=user.pk).is_editor)
+
+    def test_cached_roles_are_invalidated_after_losing_the_version(self):
+        user = mommy.make(UserProfile)
+        # the version can be culled from the cache
+        cache.delete(UserProfile.ROLES_CACHE_VERSION_KEY)
+        with patch('evap.evaluation.tools.time') as mock:
+            mock.time.return_value = 1000
+            UserProfile.invalidate_cached_roles()
+        self.assertFalse(UserProfile.objects.get(pk=user.pk).is_editor)
+        Contribution.objects.bulk_create([mommy.prepare(Contribution, contributor=user, can_edit=True, course=mommy.make(Course))])
+
+        cache.delete(UserProfile.ROLES_CACHE_VERSION_KEY)
+        with patch('evap.evaluation.tools.time') as mock:
+            mock.time.return_value = 2000
+            UserProfile.invalidate_cached_roles()
+        self.assertTrue(UserProfile.objects.get(pk=user.pk).is_editor)
+
+    def test_cached_roles_are_invalidated_by_signals(self):
+        user = mommy.make(UserProfile)
+        other_user = mommy.make(UserProfile)
+        course = mommy.make(Course)
+        group = Group.objects.get(name="Grade publisher")
+
+        def roles():
+            return UserProfile.objects.get(pk=user.pk).roles
+
+        self.assertFalse(any(roles().values()))
+
+        course.participants.add(user)
+        self.assertTrue(roles()['is_participant'])
+        user.courses_participating_in.remove(course)
+        self.assertFalse(roles()['is_participant'])
+        course.participants.add(user)
+        course.participants.clear()
+        self.assertFalse(roles()['is_participant'])
+
+        contribution = mommy.make(Contribution, contributor=user, course=course)
+        self.assertTrue(roles()['is_contributor'])
+        contribution.can_edit = True
+        contribution.save()
+        self.assertTrue(roles()['is_editor'])
+        contribution.contributor = other_user
+        contribution.save()
+        self.assertFalse(roles()['is_contributor'])
+        contribution.contributor = user
+        contribution.save()
+        course.delete()
+        self.assertFalse(roles()['is_contributor'])
+
+        other_user.delegates.add(user)
+        self.assertTrue(roles()['is_delegate'])
+        user.represented_users.remove(other_user)
+        self.assertFalse(roles()['is_delegate'])
+
+        group.user_set.add(user)
+        self.assertTrue(roles()['is_grade_publisher'])
+        user.groups.remove(group)
+        self.assertFalse(roles()['is_grade_publisher'])
+
 
 class ArchivingTests(TestCase):
 
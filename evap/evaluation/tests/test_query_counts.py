@@ -0,0 +1,322 @@
+import os
+import traceback
+from collections import Counter
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.urlresolvers import get_resolver, reverse, RegexURLResolver
+from django.db.backends.utils import CursorWrapper
+from django.test import TestCase
+from django.test.utils import override_settings
+from model_mommy import mommy
+
+from evap.evaluation.models import Contribution, Course, CourseType, Degree, EmailTemplate, FaqSection, Question, Questionnaire, \
+                                   RatingAnswerCounter, Semester, TextAnswer, UserProfile
+from evap.grades.models import GradeDocument
+from evap.rewards.models import RewardPointRedemptionEvent
+
+
+"""
+These tests request every view of evap once with a small and once with a large data set and verify that the number
+of database queries does not depend on the amount of data, i.e. that no view issues queries per course, user etc.
+"""
+
+
+EVAP_DIR = os.path.dirname(settings.BASE_DIR)
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# namespaces of included URL configurations that are not part of evap
+IGNORED_NAMESPACES = ['admin', 'djdt']
+
+# URL names that are not requested by the tests, with the reason why
+SKIPPED_URLS = {
+    'django-auth-logout': "logs the user out",
+    'set_language': "only accepts POST requests",
+    'evaluation:feedback_send': "only accepts POST requests",
+    'staff:semester_delete': "only accepts POST requests",
+    'staff:semester_archive': "only accepts POST requests",
+    'staff:course_delete': "only accepts POST requests",
+    'staff:course_comments_update_publish': "only accepts POST requests",
+    'staff:questionnaire_delete': "only accepts POST requests",
+    'staff:questionnaire_update_indices': "only accepts POST requests",
+    'staff:user_delete': "only accepts POST requests",
+    'staff:user_bulk_delete': "only accepts POST requests",
+    'grades:toggle_no_grades': "only accepts POST requests",
+    'grades:delete_grades': "only accepts POST requests",
+    'grades:semester_grade_activation': "changes the data",
+    'rewards:reward_point_redemption_event_delete': "only accepts POST requests",
+    'rewards:semester_activation': "changes the data",
+}
+
+# URL name: (username, function returning the URL arguments for the test case)
+REQUESTED_URLS = {
+    'evaluation:index': ('student', lambda test: []),
+    'evaluation:faq': ('student', lambda test: []),
+    'evaluation:legal_notice': ('student', lambda test: []),
+
+    'student:index': ('student', lambda test: []),
+    'student:vote': ('student', lambda test: [test.courses['in_evaluation'].id]),
+
+    'contributor:index': ('responsible', lambda test: []),
+    'contributor:settings_edit': ('responsible', lambda test: []),
+    'contributor:course_view': ('responsible', lambda test: [test.courses['approved'].id]),
+    'contributor:course_edit': ('responsible', lambda test: [test.courses['prepared'].id]),
+    'contributor:course_preview': ('responsible', lambda test: [test.courses['prepared'].id]),
+
+    'results:index': ('student', lambda test: []),
+    'results:semester_detail': ('student', lambda test: [test.semester.id]),
+    'results:course_detail': ('student', lambda test: [test.semester.id, test.courses['published'].id]),
+
+    'grades:index': ('grade_publisher', lambda test: []),
+    'grades:semester_view': ('grade_publisher', lambda test: [test.semester.id]),
+    'grades:course_view': ('grade_publisher', lambda test: [test.semester.id, test.courses['published'].id]),
+    'grades:upload_grades': ('grade_publisher', lambda test: [test.semester.id, test.courses['published'].id]),
+    'grades:edit_grades': ('grade_publisher', lambda test: [test.semester.id, test.courses['published'].id, test.grade_document.id]),
+    'grades:download_grades': ('student', lambda test: [test.grade_document.id]),
+
+    'rewards:index': ('student', lambda test: []),
+    'rewards:reward_point_redemption_events': ('staff', lambda test: []),
+    'rewards:reward_point_redemption_event_create': ('staff', lambda test: []),
+    'rewards:reward_point_redemption_event_edit': ('staff', lambda test: [test.reward_event.id]),
+    'rewards:reward_point_redemption_event_export': ('staff', lambda test: [test.reward_event.id]),
+
+    'staff:index': ('staff', lambda test: []),
+    'staff:semester_create': ('staff', lambda test: []),
+    'staff:semester_view': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_edit': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_import': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_export': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_raw_export': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_participation_export': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_questionnaire_assign': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_todo': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_lottery': ('staff', lambda test: [test.semester.id]),
+    'staff:semester_course_operation': ('staff', lambda test: [test.semester.id]),
+    'staff:course_create': ('staff', lambda test: [test.semester.id]),
+    'staff:single_result_create': ('staff', lambda test: [test.semester.id]),
+    'staff:course_edit': ('staff', lambda test: [test.semester.id, test.courses['prepared'].id]),
+    'staff:course_email': ('staff', lambda test: [test.semester.id, test.courses['prepared'].id]),
+    'staff:course_preview': ('staff', lambda test: [test.semester.id, test.courses['prepared'].id]),
+    'staff:course_participant_import': ('staff', lambda test: [test.semester.id, test.courses['prepared'].id]),
+    'staff:course_comments': ('staff', lambda test: [test.semester.id, test.courses['evaluated'].id]),
+    'staff:course_comment_edit': ('staff', lambda test: [test.semester.id, test.courses['evaluated'].id, test.text_answer.id]),
+    'staff:questionnaire_index': ('staff', lambda test: []),
+    'staff:questionnaire_create': ('staff', lambda test: []),
+    'staff:questionnaire_view': ('staff', lambda test: [test.general_questionnaire.id]),
+    'staff:questionnaire_edit': ('staff', lambda test: [test.general_questionnaire.id]),
+    'staff:questionnaire_new_version': ('staff', lambda test: [test.general_questionnaire.id]),
+    'staff:questionnaire_copy': ('staff', lambda test: [test.general_questionnaire.id]),
+    'staff:degree_index': ('staff', lambda test: []),
+    'staff:course_type_index': ('staff', lambda test: []),
+    'staff:course_type_merge_selection': ('staff', lambda test: []),
+    'staff:course_type_merge': ('staff', lambda test: [test.course_type.id, test.other_course_type.id]),
+    'staff:user_index': ('staff', lambda test: []),
+    'staff:user_create': ('staff', lambda test: []),
+    'staff:user_import': ('staff', lambda test: []),
+    'staff:user_edit': ('staff', lambda test: [test.student.id]),
+    'staff:user_merge_selection': ('staff', lambda test: []),
+    'staff:user_merge': ('staff', lambda test: [test.student.id, test.other_student.id]),
+    'staff:template_edit': ('staff', lambda test: [EmailTemplate.objects.first().id]),
+    'staff:faq_index': ('staff', lambda test: []),
+    'staff:faq_section': ('staff', lambda test: [test.faq_section.id]),
+    'staff:request_statistics': ('staff', lambda test: []),
+    'staff:request_statistics_export': ('staff', lambda test: []),
+}
+
+# URL names of views whose number of queries is known to grow with the amount of data.
+# Remove a view from this list once it has been fixed, the tests fail for views in here that don't grow anymore.
+URLS_WITH_GROWING_QUERY_COUNTS = {
+    'evaluation:faq',
+    'contributor:index',
+    'rewards:reward_point_redemption_events',
+    'staff:semester_raw_export',
+    'staff:semester_participation_export',
+    'staff:semester_todo',
+    'staff:questionnaire_index',
+    'staff:user_create',
+    'staff:user_edit',
+    'staff:user_merge',
+}
+
+
+def get_url_names(resolver=None, namespace=None):
+    """Returns the namespaced names of all URL patterns reachable from evap/urls.py."""
+    resolver = resolver or get_resolver(None)
+    names = []
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, RegexURLResolver):
+            if pattern.namespace in IGNORED_NAMESPACES:
+                continue
+            names += get_url_names(pattern, pattern.namespace or namespace)
+        elif pattern.name:
+            names.append("{}:{}".format(namespace, pattern.name) if namespace else pattern.name)
+    return names
+
+
+def get_call_site():
+    """Returns the innermost frame of evap's code (excluding the tests) in the current stack as string."""
+    for filename, line_number, function_name, __ in reversed(traceback.extract_stack()):
+        if filename.startswith(EVAP_DIR) and not filename.startswith(TESTS_DIR):
+            return "{}:{} in {}".format(os.path.relpath(filename, EVAP_DIR), line_number, function_name)
+    return "<unknown>"
+
+
+class CaptureCallSitesContext:
+    """Context manager that records the call site of every database query executed in its context."""
+
+    def __enter__(self):
+        self.call_sites = Counter()
+        original_execute = CursorWrapper.execute
+        original_executemany = CursorWrapper.executemany
+
+        def execute(cursor, sql, params=None):
+            self.call_sites[get_call_site()] += 1
+            return original_execute(cursor, sql, params)
+
+        def executemany(cursor, sql, param_list):
+            self.call_sites[get_call_site()] += 1
+            return original_executemany(cursor, sql, param_list)
+
+        self.patchers = [patch.object(CursorWrapper, 'execute', execute), patch.object(CursorWrapper, 'executemany', executemany)]
+        for patcher in self.patchers:
+            patcher.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def __len__(self):
+        return sum(self.call_sites.values())
+
+
+# the database caches used by the other tests need several queries per key, so that every view caching something per
+# course would execute more queries with more data. local memory caches are the stand-ins for the shared caches here.
+QUERY_COUNT_CACHES = dict(
+    {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-counts-' + alias} for alias in settings.CACHES},
+    default=settings.CACHES['default'],
+)
+
+
+@override_settings(INSTITUTION_EMAIL_DOMAINS=["example.com"], CACHES=QUERY_COUNT_CACHES)
+class TestQueryCounts(TestCase):
+    SMALL_SCALE = 1
+    LARGE_SCALE = 10
+
+    COURSE_STATES = ['new', 'prepared', 'editor_approved', 'approved', 'in_evaluation', 'evaluated', 'reviewed', 'published']
+
+    def setUp(self):
+        self.staff = mommy.make(UserProfile, username='staff', email='staff@example.com', groups=[Group.objects.get(name='Staff')])
+        self.grade_publisher = mommy.make(UserProfile, username='grade_publisher', email='grade_publisher@example.com',
+                                          groups=[Group.objects.get(name='Grade publisher')])
+        self.responsible = mommy.make(UserProfile, username='responsible', email='responsible@example.com')
+        self.student = mommy.make(UserProfile, username='student', email='student@example.com')
+        self.other_student = mommy.make(UserProfile, username='other_student', email='other_student@example.com')
+
+        self.semester = mommy.make(Semester)
+        self.degree = mommy.make(Degree)
+        self.course_type = mommy.make(CourseType)
+        self.other_course_type = mommy.make(CourseType)
+
+        self.general_questionnaire = mommy.make(Questionnaire, is_for_contributors=False)
+        self.general_rating_question = mommy.make(Question, questionnaire=self.general_questionnaire, type="G")
+        self.general_text_question = mommy.make(Question, questionnaire=self.general_questionnaire, type="T")
+        self.contributor_questionnaire = mommy.make(Questionnaire, is_for_contributors=True)
+        self.contributor_rating_question = mommy.make(Question, questionnaire=self.contributor_questionnaire, type="L")
+
+        self.faq_section = mommy.make(FaqSection)
+        self.reward_event = mommy.make(RewardPointRedemptionEvent, date=date.today(), redeem_end_date=date.today())
+
+        self.courses = {}
+        self.add_data(self.SMALL_SCALE)
+        self.text_answer = TextAnswer.objects.filter(contribution__course=self.courses['evaluated']).first()
+        self.grade_document = GradeDocument.objects.filter(course=self.courses['published']).first()
+
+    def add_data(self, rounds):
+        """Adds a course in every state, a single result and some unrelated objects for each round."""
+        for __ in range(rounds):
+            for state in self.COURSE_STATES:
+                course = self.make_course(state)
+                self.courses.setdefault(state, course)
+            self.make_single_result()
+
+            self.make_user()
+            mommy.make(Questionnaire)
+            mommy.make(FaqSection)
+            mommy.make(RewardPointRedemptionEvent, date=date.today(), redeem_end_date=date.today())
+
+    def make_user(self):
+        user = mommy.prepare(UserProfile)
+        user.email = "{}@example.com".format(user.username)
+        user.save()
+        return user
+
+    def make_course(self, state):
+        other_participant = self.make_user()
+        has_votes = state in ['evaluated', 'reviewed', 'published']
+        course = mommy.make(Course, semester=self.semester, state=state, type=self.course_type, degrees=[self.degree],
+                            participants=[self.student, other_participant], voters=[self.student] if has_votes else [],
+                            vote_start_date=date.today() - timedelta(days=1), vote_end_date=date.today() + timedelta(days=1))
+        course.general_contribution.questionnaires = [self.general_questionnaire]
+        contribution = mommy.make(Contribution, course=course, contributor=self.responsible, responsible=True, can_edit=True,
+                                  comment_visibility=Contribution.ALL_COMMENTS, questionnaires=[self.contributor_questionnaire])
+
+        if has_votes:
+            mommy.make(RatingAnswerCounter, contribution=course.general_contribution, question=self.general_rating_question, answer=1, count=1)
+            mommy.make(RatingAnswerCounter, contribution=contribution, question=self.contributor_rating_question, answer=2, count=1)
+            mommy.make(TextAnswer, contribution=course.general_contribution, question=self.general_text_question,
+                       state=TextAnswer.PUBLISHED if state == 'published' else TextAnswer.NOT_REVIEWED)
+        if state == 'published':
+            mommy.make(GradeDocument, course=course, file='grades/document.pdf', last_modified_user=self.grade_publisher)
+        return course
+
+    def make_single_result(self):
+        course = mommy.make(Course, semester=self.semester, state='published', type=self.course_type, degrees=[self.degree],
+                            vote_start_date=date.today(), vote_end_date=date.today(), _participant_count=10, _voter_count=1)
+        single_result_questionnaire = Questionnaire.get_single_result_questionnaire()
+        contribution = mommy.make(Contribution, course=course, contributor=self.responsible, responsible=True, can_edit=True,
+                                  comment_visibility=Contribution.ALL_COMMENTS, questionnaires=[single_result_questionnaire])
+        mommy.make(RatingAnswerCounter, contribution=contribution, question=single_result_questionnaire.question_set.first(), answer=1, count=1)
+
+    def request_all_urls(self):
+        """Requests every URL in REQUESTED_URLS and returns the recorded call sites of the queries for each of them."""
+        call_sites = {}
+        for url_name, (username, get_arguments) in REQUESTED_URLS.items():
+            url = reverse(url_name, args=get_arguments(self))
+            self.client.force_login(UserProfile.objects.get(username=username))
+            # every request should start with cold caches, otherwise the second request would be cheaper
+            cache.clear()
+            with CaptureCallSitesContext() as context:
+                self.client.get(url)
+            call_sites[url_name] = context.call_sites
+        return call_sites
+
+    def test_all_urls_are_covered(self):
+        url_names = get_url_names()
+        for url_name in url_names:
+            self.assertTrue(url_name in REQUESTED_URLS or url_name in SKIPPED_URLS,
+                            'URL "{}" is neither requested by the query count tests nor explicitly skipped'.format(url_name))
+        for url_name in list(REQUESTED_URLS) + list(SKIPPED_URLS):
+            self.assertIn(url_name, url_names)
+
+    def test_query_counts_do_not_grow_with_data_size(self):
+        small_call_sites = self.request_all_urls()
+        self.add_data(self.LARGE_SCALE - self.SMALL_SCALE)
+        large_call_sites = self.request_all_urls()
+
+        failures = []
+        for url_name in REQUESTED_URLS:
+            small, large = small_call_sites[url_name], large_call_sites[url_name]
+            grows = sum(large.values()) > sum(small.values())
+            if grows and url_name not in URLS_WITH_GROWING_QUERY_COUNTS:
+                report = "\n".join("    {}: {} -> {} queries".format(call_site, small[call_site], large[call_site])
+                                   for call_site in sorted(large) if large[call_site] > small[call_site])
+                failures.append('"{}" executes {} queries with {}x and {} queries with {}x the data, caused by:\n{}'.format(
+                    url_name, sum(small.values()), self.SMALL_SCALE, sum(large.values()), self.LARGE_SCALE, report))
+            elif not grows and url_name in URLS_WITH_GROWING_QUERY_COUNTS:
+                failures.append('"{}" does not execute more queries with more data anymore, remove it from URLS_WITH_GROWING_QUERY_COUNTS'.format(url_name))
+
+        self.assertFalse(failures, "\n" + "\n".join(failures))
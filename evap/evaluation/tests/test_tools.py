@@ -1,9 +1,20 @@
+from collections import OrderedDict
+from statistics import mean, pstdev
+from unittest.mock import patch
+
 from django.core.cache import cache
+from django.db import connection
 from django.test.testcases import TestCase
+from django.test.utils import CaptureQueriesContext
 from model_mommy import mommy
 
-from evap.evaluation.models import Course
-from evap.evaluation.tools import calculate_results
+from evap.evaluation.models import Course, Contribution, Question, Questionnaire, RatingAnswerCounter, TextAnswer, UserProfile, \
+                                   PublishedRatingResult, RatingAnswerAggregate
+from evap.evaluation.tools import calculate_results, calculate_results_for_courses, get_average_and_deviation, \
+                                  calculate_average_grades_and_deviation, calculate_average_grades_and_deviation_for_courses, \
+                                  _calculate_results_impl, get_results_cache_key, get_results_lock_key, refresh_results_cache, \
+                                  RESULTS_CACHE_VERSION, RESULTS_CACHE_SOFT_TIMEOUT, get_course_statistics, CourseStatistics
+from evap.grades.models import GradeDocument
 
 
 class TestCalculateResults(TestCase):
@@ -15,3 +26,255 @@ class TestCalculateResults(TestCase):
         calculate_results(course)
 
         self.assertIsNotNone(cache.get('evap.staff.results.tools.calculate_results-{:d}'.format(course.id)))
+
+    def test_cached_results_equal_calculated_results(self):
+        course = mommy.make(Course, state='published')
+        questionnaire = mommy.make(Questionnaire)
+        likert_question = mommy.make(Question, questionnaire=questionnaire, type="L")
+        text_question = mommy.make(Question, questionnaire=questionnaire, type="T")
+        contribution = mommy.make(Contribution, course=course, contributor=mommy.make(UserProfile), label="label", questionnaires=[questionnaire])
+        mommy.make(RatingAnswerCounter, contribution=contribution, question=likert_question, answer=2, count=3)
+        mommy.make(TextAnswer, contribution=contribution, question=text_question, original_answer="original", reviewed_answer="reviewed", state=TextAnswer.PUBLISHED)
+
+        calculated_sections = calculate_results(course)
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            cached_sections = calculate_results(course)
+        self.assertEqual(mock.call_count, 0)
+
+        self.assertEqual(cached_sections, calculated_sections)
+        section = cached_sections[0]
+        self.assertEqual((section.questionnaire, section.contributor, section.label), (questionnaire, contribution.contributor, "label"))
+        self.assertEqual(section.results[0].counts, OrderedDict(((1, 0), (2, 3), (3, 0), (4, 0), (5, 0))))
+        answer = section.results[1].answers[0]
+        self.assertEqual((answer.answer, answer.state, answer.contribution), ("reviewed", TextAnswer.PUBLISHED, contribution))
+
+    def test_outdated_cache_entries_are_recalculated(self):
+        course = mommy.make(Course, state='published')
+        course.general_contribution.questionnaires = [mommy.make(Questionnaire)]
+        cache.set(get_results_cache_key(course), (RESULTS_CACHE_VERSION - 1, []))
+
+        self.assertEqual(len(calculate_results(course)), 1)
+        self.assertEqual(cache.get(get_results_cache_key(course))[0], RESULTS_CACHE_VERSION)
+
+    def test_unversioned_cache_entries_are_recalculated(self):
+        course = mommy.make(Course, state='published')
+        course.general_contribution.questionnaires = [mommy.make(Questionnaire)]
+        for old_entry in [[], [(1, None, False, [])]]:
+            cache.set(get_results_cache_key(course), old_entry)
+
+            self.assertEqual(len(calculate_results(course)), 1)
+            self.assertEqual(cache.get(get_results_cache_key(course))[0], RESULTS_CACHE_VERSION)
+
+    def make_outdated(self, course):
+        version, calculated_at, compact_sections = cache.get(get_results_cache_key(course))
+        cache.set(get_results_cache_key(course), (version, calculated_at - RESULTS_CACHE_SOFT_TIMEOUT - 1, compact_sections))
+
+    def test_outdated_results_are_recalculated_once(self):
+        course = mommy.make(Course, state='published')
+        refresh_results_cache([course])
+        self.make_outdated(course)
+
+        # another request is recalculating the results, so the outdated ones are used
+        cache.add(get_results_lock_key(course), True)
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            calculate_results(course)
+        self.assertEqual(mock.call_count, 0)
+
+        cache.delete(get_results_lock_key(course))
+        calculate_results(course)
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            calculate_results(course)
+        self.assertEqual(mock.call_count, 0)
+        self.assertIsNone(cache.get(get_results_lock_key(course)))
+
+    def test_waits_for_missing_results_calculated_by_another_request(self):
+        course = mommy.make(Course, state='published')
+        refresh_results_cache([course])
+        entry = cache.get(get_results_cache_key(course))
+        cache.delete(get_results_cache_key(course))
+
+        cache.add(get_results_lock_key(course), True)
+        with patch('evap.evaluation.tools.time.sleep', side_effect=lambda seconds: cache.set(get_results_cache_key(course), entry)) as sleep_mock, \
+                patch('evap.evaluation.tools._calculate_result_sections') as calculate_mock:
+            calculate_results(course)
+        self.assertEqual(sleep_mock.call_count, 1)
+        self.assertEqual(calculate_mock.call_count, 0)
+
+    @patch('evap.evaluation.tools.RESULTS_LOCK_WAIT_TIME', 0)
+    def test_calculates_missing_results_if_waiting_fails(self):
+        course = mommy.make(Course, state='published')
+        course.general_contribution.questionnaires = [mommy.make(Questionnaire)]
+        cache.add(get_results_lock_key(course), True)
+
+        self.assertEqual(len(calculate_results(course)), 1)
+        self.assertIsNotNone(cache.get(get_results_cache_key(course)))
+
+    def test_number_of_queries_independent_of_course_size(self):
+        course = mommy.make(Course, state='published')
+        questionnaire = mommy.make(Questionnaire)
+        likert_question = mommy.make(Question, questionnaire=questionnaire, type="L")
+        text_question = mommy.make(Question, questionnaire=questionnaire, type="T")
+        course.general_contribution.questionnaires = [questionnaire]
+
+        def add_contribution():
+            contribution = mommy.make(Contribution, course=course, contributor=mommy.make(UserProfile), questionnaires=[questionnaire])
+            mommy.make(RatingAnswerCounter, contribution=contribution, question=likert_question, answer=1, count=3)
+            mommy.make(RatingAnswerCounter, contribution=contribution, question=likert_question, answer=3, count=1)
+            mommy.make(TextAnswer, contribution=contribution, question=text_question, state=TextAnswer.PUBLISHED)
+
+        add_contribution()
+        with CaptureQueriesContext(connection) as small_course_queries:
+            _calculate_results_impl(course)
+
+        for __ in range(5):
+            add_contribution()
+        with self.assertNumQueries(len(small_course_queries)):
+            sections = _calculate_results_impl(course)
+
+        self.assertEqual(len(sections), 7)
+        for section in sections[1:]:
+            rating_result, text_result = section.results
+            self.assertEqual(rating_result.total_count, 4)
+            self.assertEqual(rating_result.average, 1.5)
+            self.assertEqual(rating_result.counts, OrderedDict(((1, 3), (2, 0), (3, 1), (4, 0), (5, 0))))
+            self.assertEqual(len(text_result.answers), 1)
+
+
+class TestCalculateResultsForCourses(TestCase):
+    def test_matches_calculate_results(self):
+        questionnaire = mommy.make(Questionnaire)
+        question = mommy.make(Question, questionnaire=questionnaire, type="G")
+        courses = [mommy.make(Course, state='evaluated') for __ in range(3)]
+        for answer, course in enumerate(courses, start=1):
+            course.general_contribution.questionnaires = [questionnaire]
+            mommy.make(RatingAnswerCounter, contribution=course.general_contribution, question=question, answer=answer, count=2)
+
+        with self.assertNumQueries(5):
+            results = calculate_results_for_courses(courses)
+
+        for answer, course in enumerate(courses, start=1):
+            self.assertEqual(results[course], calculate_results(course))
+            self.assertEqual(results[course][0].results[0].average, answer)
+
+    def test_caches_published_courses(self):
+        course = mommy.make(Course, state='published')
+
+        calculate_results_for_courses([course])
+
+        self.assertIsNotNone(cache.get('evap.staff.results.tools.calculate_results-{:d}'.format(course.id)))
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            calculate_results_for_courses([course])
+        self.assertEqual(mock.call_count, 0)
+
+
+class TestCourseStatistics(TestCase):
+    def test_counts(self):
+        course = mommy.make(Course, state='in_evaluation')
+        other_course = mommy.make(Course, semester=course.semester)
+        mommy.make(TextAnswer, contribution=course.general_contribution, state=TextAnswer.NOT_REVIEWED)
+        mommy.make(TextAnswer, contribution=course.general_contribution, state=TextAnswer.PUBLISHED)
+        mommy.make(GradeDocument, course=course, type=GradeDocument.FINAL_GRADES)
+
+        statistics = get_course_statistics(course.semester)
+        self.assertEqual(statistics, {course.id: CourseStatistics(2, 1, 0, 1)})
+        self.assertNotIn(other_course.id, statistics)
+
+        with self.assertNumQueries(1):  # the database cache
+            self.assertEqual(get_course_statistics(course.semester), statistics)
+
+    def test_is_invalidated_by_voters_reviews_and_grade_documents(self):
+        course = mommy.make(Course, state='in_evaluation')
+        student = mommy.make(UserProfile)
+        course.participants = [student]
+        textanswer = mommy.make(TextAnswer, contribution=course.general_contribution)
+        get_course_statistics(course.semester)
+
+        TextAnswer.objects.bulk_create([mommy.prepare(TextAnswer, contribution=course.general_contribution, question=textanswer.question)])
+        student.courses_voted_for.add(course)
+        self.assertEqual(get_course_statistics(course.semester)[course.id].num_textanswers, 2)
+
+        textanswer.publish()
+        textanswer.save()
+        self.assertEqual(get_course_statistics(course.semester)[course.id].num_reviewed_textanswers, 1)
+
+        mommy.make(GradeDocument, course=course)
+        self.assertEqual(get_course_statistics(course.semester)[course.id].num_midterm_grade_documents, 1)
+
+        TextAnswer.objects.filter(contribution__course=course).delete()
+        student.courses_voted_for.clear()
+        self.assertEqual(get_course_statistics(course.semester)[course.id].num_textanswers, 0)
+
+
+class TestGetAverageAndDeviation(TestCase):
+    def test_no_answers(self):
+        self.assertEqual(get_average_and_deviation([]), (None, None))
+        self.assertEqual(get_average_and_deviation([RatingAnswerCounter(answer=1, count=0)]), (None, None))
+
+    def test_matches_statistics_of_single_answers(self):
+        answer_counters = [RatingAnswerCounter(answer=1, count=5), RatingAnswerCounter(answer=2, count=3), RatingAnswerCounter(answer=5, count=1)]
+        answers = [1] * 5 + [2] * 3 + [5]
+
+        average, deviation = get_average_and_deviation(answer_counters)
+
+        self.assertAlmostEqual(average, mean(answers))
+        self.assertAlmostEqual(deviation, pstdev(answers))
+
+
+class TestPublishedRatingResults(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = mommy.make(Course, state='reviewed')
+        questionnaire = mommy.make(Questionnaire)
+        cls.question = mommy.make(Question, questionnaire=questionnaire, type="G")
+        mommy.make(Question, questionnaire=questionnaire, type="T")
+        cls.course.general_contribution.questionnaires = [questionnaire]
+        contribution = mommy.make(Contribution, course=cls.course, contributor=mommy.make(UserProfile), questionnaires=[questionnaire])
+        mommy.make(RatingAnswerCounter, contribution=cls.course.general_contribution, question=cls.question, answer=1, count=3)
+        mommy.make(RatingAnswerCounter, contribution=contribution, question=cls.question, answer=4, count=2)
+
+    def test_publish_stores_and_unpublish_deletes_results(self):
+        self.course.publish()
+        self.course.save()
+
+        self.assertEqual(PublishedRatingResult.objects.filter(course=self.course).count(), 2)
+        general_result = PublishedRatingResult.objects.get(contribution=self.course.general_contribution, question=self.question)
+        self.assertEqual(general_result.total_count, 3)
+        self.assertEqual(general_result.average, 1)
+        self.assertEqual(general_result.counts, OrderedDict(((1, 3), (2, 0), (3, 0), (4, 0), (5, 0))))
+
+        self.course.unpublish()
+        self.course.save()
+
+        self.assertFalse(PublishedRatingResult.objects.filter(course=self.course).exists())
+
+    def test_stored_results_give_same_grades(self):
+        expected_grades = calculate_average_grades_and_deviation(self.course)
+        self.course.publish()
+        self.course.save()
+
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            grades = calculate_average_grades_and_deviation_for_courses([self.course])
+
+        self.assertEqual(mock.call_count, 0)
+        self.assertEqual(grades[self.course], expected_grades)
+
+
+class TestRatingAnswerAggregates(TestCase):
+    def test_aggregates_give_same_grades(self):
+        course = mommy.make(Course, state='evaluated')
+        questionnaire = mommy.make(Questionnaire)
+        question = mommy.make(Question, questionnaire=questionnaire, type="L")
+        course.general_contribution.questionnaires = [questionnaire]
+        for answer, count in [(1, 4), (2, 1), (5, 2)]:
+            mommy.make(RatingAnswerCounter, contribution=course.general_contribution, question=question, answer=answer, count=count)
+        aggregate = RatingAnswerAggregate(contribution=course.general_contribution, question=question)
+        aggregate.recalculate()
+        aggregate.save()
+
+        with patch('evap.evaluation.tools._calculate_result_sections') as mock:
+            grades = calculate_average_grades_and_deviation_for_courses([course])
+
+        self.assertEqual(mock.call_count, 0)
+        expected_average, expected_deviation = calculate_average_grades_and_deviation(course)
+        self.assertAlmostEqual(grades[course][0], expected_average)
+        self.assertAlmostEqual(grades[course][1], expected_deviation)
@@ -1,15 +1,16 @@
 from collections import OrderedDict, defaultdict
 from collections import namedtuple
-from functools import partial
-from math import ceil
-from statistics import pstdev, median
+from math import ceil, sqrt
+from statistics import median
+import time
 
 from django.conf import settings
 from django.core.cache import cache
 from django.utils.translation import ugettext_lazy as _
-from django.db.models import Sum
+from django.db.models import Case, Count, F, Q, Sum, When
 
-from evap.evaluation.models import TextAnswer, EmailTemplate, Course, Contribution, RatingAnswerCounter
+from evap.evaluation.models import TextAnswer, EmailTemplate, Course, Contribution, RatingAnswerCounter, RatingAnswerAggregate, \
+                                   PublishedRatingResult, Questionnaire, Question
 
 
 GRADE_COLORS = {
@@ -113,12 +114,17 @@ def get_sum_of_answer_counters(answer_counters):
     return answer_counters.aggregate(total_count=Sum('count'))['total_count'] or 0
 
 
-def get_answers_from_answer_counters(answer_counters):
-    answers = []
-    for answer_counter in answer_counters:
-        for __ in range(0, answer_counter.count):
-            answers.append(answer_counter.answer)
-    return answers
+def get_average_and_deviation(answer_counters):
+    """Calculates the average and the population standard deviation of the answers
+    counted by `answer_counters` directly from the (answer, count) pairs. Returns
+    `None` for both if there are no answers."""
+    total_count = sum(answer_counter.count for answer_counter in answer_counters)
+    if total_count == 0:
+        return None, None
+
+    average = sum(answer_counter.answer * answer_counter.count for answer_counter in answer_counters) / total_count
+    variance = sum(answer_counter.count * (answer_counter.answer - average) ** 2 for answer_counter in answer_counters) / total_count
+    return average, sqrt(variance)
 
 
 def get_textanswers(contribution, question, filter_states=None):
@@ -140,12 +146,190 @@ def get_counts(answer_counters):
     return counts
 
 
+def get_results_cache_key(course):
+    return 'evap.staff.results.tools.calculate_results-{:d}'.format(course.id)
+
+
+def get_results_lock_key(course):
+    return 'evap.evaluation.tools.results_lock-{:d}'.format(course.id)
+
+
+# the results are cached as (version, calculation time, compact sections), see _compact_result_sections.
+# increase this whenever that form changes, entries of other versions are then recalculated.
+RESULTS_CACHE_VERSION = 2
+# cached results older than this are recalculated by the next request, while concurrent requests still use the old ones.
+# this limits how long e.g. changes of text answers after publishing can take to show up.
+RESULTS_CACHE_SOFT_TIMEOUT = 24 * 60 * 60
+# a request calculating results holds their lock for at most this long
+RESULTS_LOCK_TIMEOUT = 60
+# how long requests wait for missing results calculated by another request before calculating them themselves
+RESULTS_LOCK_WAIT_TIME = 5
+RESULTS_LOCK_POLL_INTERVAL = 0.1
+
+
 def calculate_results(course):
     if course.state != "published":
         return _calculate_results_impl(course)
 
-    cache_key = 'evap.staff.results.tools.calculate_results-{:d}'.format(course.id)
-    return cache.get_or_set(cache_key, partial(_calculate_results_impl, course), None)
+    return calculate_results_for_courses([course])[course]
+
+
+def calculate_results_for_courses(courses):
+    """Calculates the results of several courses at once. Returns a dict mapping
+    each course to its list of `ResultSection` tuples (see `calculate_results`).
+
+    Results of published courses are taken from the cache where possible. All
+    other courses are calculated together using a constant number of queries.
+
+    Only one request at a time calculates missing or outdated results of a course.
+    Concurrent requests use the outdated results or wait for the missing ones."""
+    courses = list(courses)
+
+    cached_entries = _get_cached_results([course for course in courses if course.state == "published"])
+    now = time.time()
+    outdated_courses = [course for course, (calculated_at, __) in cached_entries.items() if calculated_at + RESULTS_CACHE_SOFT_TIMEOUT < now]
+    missing_courses = [course for course in courses if course.state == "published" and course not in cached_entries]
+    locked_courses = [course for course in outdated_courses + missing_courses if cache.add(get_results_lock_key(course), True, RESULTS_LOCK_TIMEOUT)]
+    try:
+        cached_entries.update(_wait_for_cached_results([course for course in missing_courses if course not in locked_courses]))
+        results = _expand_result_sections({course: compact_sections for course, (__, compact_sections) in cached_entries.items() if course not in locked_courses})
+        results.update(_calculate_and_cache_results([course for course in courses if course not in results]))
+    finally:
+        cache.delete_many([get_results_lock_key(course) for course in locked_courses])
+    return results
+
+
+def _get_cached_results(courses):
+    """Returns a dict mapping the given courses to the calculation time and the compact
+    sections of their cached results. Entries of other versions are left out, including the
+    bare lists of sections cached before the entries were versioned."""
+    cache_keys = {get_results_cache_key(course): course for course in courses}
+    return {cache_keys[cache_key]: tuple(entry[1:]) for cache_key, entry in cache.get_many(cache_keys.keys()).items()
+            if isinstance(entry, tuple) and entry and entry[0] == RESULTS_CACHE_VERSION}
+
+
+def _wait_for_cached_results(courses):
+    """Waits until the results of the given courses calculated by other requests are cached,
+    at most for RESULTS_LOCK_WAIT_TIME. Returns the cached results like `_get_cached_results`."""
+    cached_entries = {}
+    deadline = time.time() + RESULTS_LOCK_WAIT_TIME
+    while courses and time.time() < deadline:
+        time.sleep(RESULTS_LOCK_POLL_INTERVAL)
+        cached_entries.update(_get_cached_results(courses))
+        courses = [course for course in courses if course not in cached_entries]
+    return cached_entries
+
+
+def refresh_results_cache(courses, only_missing=False):
+    """Calculates the results of the published ones of the given courses and stores
+    them in the cache, replacing existing entries unless `only_missing` is set.
+    Returns the number of courses whose results were calculated."""
+    courses = [course for course in courses if course.state == "published"]
+    if only_missing:
+        cached_entries = _get_cached_results(courses)
+        courses = [course for course in courses if course not in cached_entries]
+    _calculate_and_cache_results(courses)
+    return len(courses)
+
+
+def _calculate_and_cache_results(courses):
+    """Calculates the results of the given courses using a constant number of queries
+    and caches those of published courses. Returns a dict mapping each course to its sections."""
+    courses_to_calculate = {course.id: course for course in courses}
+    if not courses_to_calculate:
+        return {}
+
+    contributions_by_course = defaultdict(list)
+    course_ids_by_contribution = {}
+    contributions = Contribution.objects.filter(course__in=courses_to_calculate.keys()) \
+        .select_related("contributor").prefetch_related("questionnaires__question_set")
+    for contribution in contributions:
+        contribution.course = courses_to_calculate[contribution.course_id]
+        contributions_by_course[contribution.course_id].append(contribution)
+        course_ids_by_contribution[contribution.id] = contribution.course_id
+
+    answer_counters_by_course = defaultdict(list)
+    for answer_counter in RatingAnswerCounter.objects.filter(contribution__course__in=courses_to_calculate.keys()):
+        answer_counters_by_course[course_ids_by_contribution[answer_counter.contribution_id]].append(answer_counter)
+
+    textanswers_by_course = defaultdict(list)
+    textanswers = TextAnswer.objects.filter(contribution__course__in=courses_to_calculate.keys(), state__in=[TextAnswer.PRIVATE, TextAnswer.PUBLISHED])
+    for textanswer in textanswers:
+        textanswers_by_course[course_ids_by_contribution[textanswer.contribution_id]].append(textanswer)
+
+    results = {}
+    sections_to_cache = {}
+    for course_id, course in courses_to_calculate.items():
+        sections = _calculate_result_sections(contributions_by_course[course_id], answer_counters_by_course[course_id], textanswers_by_course[course_id])
+        results[course] = sections
+        if course.state == "published":
+            sections_to_cache[get_results_cache_key(course)] = (RESULTS_CACHE_VERSION, time.time(), _compact_result_sections(sections))
+    cache.set_many(sections_to_cache, None)
+
+    return results
+
+
+def _compact_result_sections(sections):
+    """Converts the `ResultSection` list of a course to the form stored in the cache.
+    It only contains ids, numbers and the text answers' texts, so it is small and
+    doesn't depend on the pickled form of model instances. See `_expand_result_sections`."""
+    compact_sections = []
+    for section in sections:
+        compact_results = []
+        for result in section.results:
+            if isinstance(result, RatingResult):
+                compact_results.append((result.question.id, result.total_count, result.average, result.deviation,
+                                        tuple(result.counts.items()), result.warning))
+            else:
+                compact_answers = tuple((answer.id, answer.original_answer, answer.reviewed_answer, answer.state) for answer in result.answers)
+                compact_results.append((result.question.id, compact_answers))
+        compact_sections.append((section.questionnaire.id, section.contributor.id if section.contributor else None, section.warning, compact_results))
+    return compact_sections
+
+
+def _expand_result_sections(compact_sections_by_course):
+    """Converts the cached results of several courses back to `ResultSection` lists.
+    The contributions, questionnaires and questions are fetched using a constant
+    number of queries. Returns a dict mapping each course to its sections, courses
+    whose cached results refer to deleted objects are left out."""
+    if not compact_sections_by_course:
+        return {}
+
+    courses_by_id = {course.id: course for course in compact_sections_by_course}
+    contributions = {}
+    for contribution in Contribution.objects.filter(course__in=courses_by_id.keys()).select_related("contributor"):
+        contribution.course = courses_by_id[contribution.course_id]
+        contributions[(contribution.course_id, contribution.contributor_id)] = contribution
+
+    questionnaire_ids = {compact_section[0] for compact_sections in compact_sections_by_course.values() for compact_section in compact_sections}
+    questionnaires = {questionnaire.id: questionnaire for questionnaire in Questionnaire.objects.filter(id__in=questionnaire_ids).prefetch_related("question_set")}
+    questions = {question.id: question for questionnaire in questionnaires.values() for question in questionnaire.question_set.all()}
+
+    results = {}
+    for course, compact_sections in compact_sections_by_course.items():
+        try:
+            results[course] = [_expand_result_section(compact_section, course, contributions, questionnaires, questions) for compact_section in compact_sections]
+        except KeyError:
+            # e.g. a questionnaire was removed from the course, so the results are recalculated
+            continue
+    return results
+
+
+def _expand_result_section(compact_section, course, contributions, questionnaires, questions):
+    questionnaire_id, contributor_id, warning, compact_results = compact_section
+    contribution = contributions[(course.id, contributor_id)]
+    results = []
+    for compact_result in compact_results:
+        question = questions[compact_result[0]]
+        if question.is_rating_question:
+            __, total_count, average, deviation, counts, result_warning = compact_result
+            results.append(RatingResult(question, total_count, average, deviation, OrderedDict(counts), result_warning))
+        else:
+            answers = [TextAnswer(id=answer_id, contribution=contribution, question=question, original_answer=original_answer,
+                                  reviewed_answer=reviewed_answer, state=state)
+                       for answer_id, original_answer, reviewed_answer, state in compact_result[1]]
+            results.append(TextResult(question=question, answers=answers))
+    return ResultSection(questionnaires[questionnaire_id], contribution.contributor, contribution.label, results, warning)
 
 
 def _calculate_results_impl(course):
@@ -153,7 +337,40 @@ def _calculate_results_impl(course):
     `ResultSection` tuples. Each of those tuples contains the questionnaire, the
     contributor (or None), a list of single result elements, the average grade and
     deviation for that section (or None). The result elements are either
-    `RatingResult` or `TextResult` instances."""
+    `RatingResult` or `TextResult` instances.
+
+    All answers of the course are fetched at once and grouped in memory, so the
+    number of queries does not depend on the number of contributions and questions."""
+
+    contributions = course.contributions.select_related("contributor").prefetch_related("questionnaires__question_set")
+    answer_counters = RatingAnswerCounter.objects.filter(contribution__course=course)
+    textanswers = TextAnswer.objects.filter(contribution__course=course, state__in=[TextAnswer.PRIVATE, TextAnswer.PUBLISHED])
+
+    return _calculate_result_sections(contributions, answer_counters, textanswers)
+
+
+def _group_answers(answers):
+    """Groups answer objects by their (contribution id, question id) pair."""
+    grouped_answers = defaultdict(list)
+    for answer in answers:
+        grouped_answers[(answer.contribution_id, answer.question_id)].append(answer)
+    return grouped_answers
+
+
+def _calculate_result_sections(contributions, answer_counters, textanswers):
+    """Builds the `ResultSection` list of a course from its contributions (with
+    prefetched questionnaires and questions) and all of its rating answer
+    counters and visible text answers."""
+
+    counters_by_contribution_question = _group_answers(answer_counters)
+    textanswers_by_contribution_question = _group_answers(textanswers)
+
+    questionnaire_contribution_pairs = []
+    for contribution in contributions:
+        for questionnaire in contribution.questionnaires.all():
+            questionnaire_contribution_pairs.append((questionnaire, contribution))
+    # sort questionnaires for general contributions first
+    questionnaire_contribution_pairs.sort(key=lambda t: not t[1].is_general)
 
     # there will be one section per relevant questionnaire--contributor pair
     sections = []
@@ -162,32 +379,33 @@ def _calculate_results_impl(course):
     questionnaire_med_answers = defaultdict(list)
     questionnaire_max_answers = {}
     questionnaire_warning_thresholds = {}
-    for questionnaire, contribution in questionnaires_and_contributions(course):
-        max_answers = max([get_number_of_answers(contribution, question) for question in questionnaire.rating_questions], default=0)
+    for questionnaire, contribution in questionnaire_contribution_pairs:
+        max_answers = max([sum(counter.count for counter in counters_by_contribution_question[(contribution.id, question.id)])
+                           for question in questionnaire.rating_questions], default=0)
         questionnaire_max_answers[(questionnaire, contribution)] = max_answers
         questionnaire_med_answers[questionnaire].append(max_answers)
     for questionnaire, max_answers in questionnaire_med_answers.items():
         questionnaire_warning_thresholds[questionnaire] = settings.RESULTS_WARNING_PERCENTAGE * median(max_answers)
 
-    for questionnaire, contribution in questionnaires_and_contributions(course):
+    for questionnaire, contribution in questionnaire_contribution_pairs:
         # will contain one object per question
         results = []
         for question in questionnaire.question_set.all():
             if question.is_rating_question:
-                answer_counters = get_answers(contribution, question)
-                answers = get_answers_from_answer_counters(answer_counters)
+                question_counters = counters_by_contribution_question[(contribution.id, question.id)]
 
-                total_count = len(answers)
-                average = avg(answers) if total_count > 0 else None
-                deviation = pstdev(answers, average) if total_count > 0 else None
-                counts = get_counts(answer_counters)
+                total_count = sum(answer_counter.count for answer_counter in question_counters)
+                average, deviation = get_average_and_deviation(question_counters)
+                counts = get_counts(question_counters)
                 warning = total_count > 0 and total_count < questionnaire_warning_thresholds[questionnaire]
 
                 results.append(RatingResult(question, total_count, average, deviation, counts, warning))
 
             elif question.is_text_question:
-                allowed_states = [TextAnswer.PRIVATE, TextAnswer.PUBLISHED]
-                answers = get_textanswers(contribution, question, allowed_states)
+                answers = textanswers_by_contribution_question[(contribution.id, question.id)]
+                for answer in answers:
+                    # avoid one query per answer when accessing the contribution later on
+                    answer.contribution = contribution
                 results.append(TextResult(question=question, answers=answers))
 
         section_warning = questionnaire_max_answers[(questionnaire, contribution)] < questionnaire_warning_thresholds[questionnaire]
@@ -199,6 +417,55 @@ def _calculate_results_impl(course):
 
 def calculate_average_grades_and_deviation(course):
     """Determines the final average grade and deviation for a course."""
+    return calculate_average_grades_and_deviation_from_results(calculate_results(course))
+
+
+def calculate_average_grades_and_deviation_for_courses(courses):
+    """Determines the final average grades and deviations for several courses.
+    Returns a dict mapping each course to a tuple of average grade and deviation.
+
+    Published courses use their stored `PublishedRatingResult`s, other courses
+    the `RatingAnswerAggregate`s updated on each vote. Only courses having
+    neither are calculated using `calculate_results_for_courses`."""
+    courses = list(courses)
+    courses_by_id = {course.id: course for course in courses}
+
+    published_rating_results = PublishedRatingResult.objects.filter(course__in=[course for course in courses if course.state == "published"])
+    grades = _calculate_average_grades_and_deviation_from_rating_results(published_rating_results)
+
+    rating_answer_aggregates = RatingAnswerAggregate.objects.filter(contribution__course__in=[course for course in courses if course.id not in grades],
+        contribution__questionnaires=F("question__questionnaire"))
+    grades.update(_calculate_average_grades_and_deviation_from_rating_results(rating_answer_aggregates))
+
+    grades = {courses_by_id[course_id]: course_grades for course_id, course_grades in grades.items()}
+
+    # e.g. courses that were published before results were stored
+    courses_to_calculate = [course for course in courses if course not in grades]
+    for course, sections in calculate_results_for_courses(courses_to_calculate).items():
+        grades[course] = calculate_average_grades_and_deviation_from_results(sections)
+    return grades
+
+
+def _calculate_average_grades_and_deviation_from_rating_results(rating_results):
+    """Determines the final average grades and deviations from a queryset of
+    objects having a contribution, a question, a total count, an average and a
+    deviation. Returns a dict mapping course ids to average grade and deviation."""
+    sections_by_course = defaultdict(OrderedDict)
+    for rating_result in rating_results.select_related("question", "contribution__contributor"):
+        section_key = (rating_result.contribution, rating_result.question.questionnaire_id)
+        sections_by_course[rating_result.contribution.course_id].setdefault(section_key, []).append(RatingResult(rating_result.question,
+            rating_result.total_count, rating_result.average, rating_result.deviation, None, False))
+
+    grades = {}
+    for course_id, sections in sections_by_course.items():
+        sections = [ResultSection(None, contribution.contributor, contribution.label, results, False) for (contribution, __), results in sections.items()]
+        grades[course_id] = calculate_average_grades_and_deviation_from_results(sections)
+    return grades
+
+
+def calculate_average_grades_and_deviation_from_results(sections):
+    """Determines the final average grade and deviation from the `ResultSection`
+    list of a course, see `calculate_results`."""
     avg_generic_likert = []
     avg_contribution_likert = []
     dev_generic_likert = []
@@ -208,7 +475,7 @@ def calculate_average_grades_and_deviation(course):
     dev_generic_grade = []
     dev_contribution_grade = []
 
-    for __, contributor, __, results, __ in calculate_results(course):
+    for __, contributor, __, results, __ in sections:
         average_likert = avg([result.average for result in results if result.question.is_likert_question])
         deviation_likert = avg([result.deviation for result in results if result.question.is_likert_question])
         average_grade = avg([result.average for result in results if result.question.is_grade_question])
@@ -235,6 +502,27 @@ def calculate_average_grades_and_deviation(course):
     return final_avg, final_dev
 
 
+def store_published_rating_results(course):
+    """Stores the rating results of the given course as `PublishedRatingResult`s,
+    replacing any previously stored ones."""
+    contributions = list(course.contributions.select_related("contributor").prefetch_related("questionnaires__question_set"))
+    contributions_by_contributor = {contribution.contributor_id: contribution for contribution in contributions}
+    answer_counters = RatingAnswerCounter.objects.filter(contribution__course=course)
+
+    published_rating_results = []
+    for section in _calculate_result_sections(contributions, answer_counters, []):
+        contribution = contributions_by_contributor[section.contributor.id if section.contributor else None]
+        for result in section.results:
+            if not isinstance(result, RatingResult):
+                continue
+            counts = {"count_{}".format(answer): count for answer, count in result.counts.items()}
+            published_rating_results.append(PublishedRatingResult(course=course, contribution=contribution, question=result.question,
+                total_count=result.total_count, average=result.average, deviation=result.deviation, warning=result.warning, **counts))
+
+    course.published_rating_results.all().delete()
+    PublishedRatingResult.objects.bulk_create(published_rating_results)
+
+
 def questionnaires_and_contributions(course):
     """Yields tuples of (questionnaire, contribution) for the given course."""
     result = []
@@ -249,6 +537,131 @@ def questionnaires_and_contributions(course):
     return result
 
 
+def get_cache_version(key):
+    """Returns the version stored in the cache under the given key. Cached entries store the version
+    they were calculated for, so that all of them can be invalidated at once with increment_cache_version."""
+    # the initial version depends on the time, so that entries cached before the version got lost are not used again
+    return cache.get_or_set(key, lambda: int(time.time()), None)
+
+
+def increment_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+NAVBAR_CACHE_VERSION_KEY = 'evap.evaluation.cache_versions.navbar'
+
+
+def get_navbar_cache_version():
+    """Returns the version of the cached navbars, which is part of their cache keys."""
+    return get_cache_version(NAVBAR_CACHE_VERSION_KEY)
+
+
+def invalidate_navbar_cache():
+    """Invalidates the cached navbars of all users at once by changing the version in their cache keys."""
+    increment_cache_version(NAVBAR_CACHE_VERSION_KEY)
+
+
+# see get_course_statistics
+CourseStatistics = namedtuple('CourseStatistics', ('num_textanswers', 'num_reviewed_textanswers', 'num_midterm_grade_documents', 'num_final_grade_documents'))
+EMPTY_COURSE_STATISTICS = CourseStatistics(0, 0, 0, 0)
+
+
+def get_semester_statistics_cache_key(semester_id):
+    return 'evap.evaluation.tools.semester_statistics-{:d}'.format(semester_id)
+
+
+def get_course_statistics(semester):
+    """Returns a dict mapping the ids of the courses of the semester to `CourseStatistics`
+    tuples. Courses without text answers and grade documents are left out. The statistics
+    are calculated using one grouped query per counted relation and cached until voters,
+    text answers or grade documents of the semester change."""
+    return cache.get_or_set(get_semester_statistics_cache_key(semester.id), lambda: _calculate_course_statistics(semester), None)
+
+
+def _calculate_course_statistics(semester):
+    # do the import here to prevent a circular import
+    from evap.grades.models import GradeDocument
+
+    counts = defaultdict(lambda: dict(EMPTY_COURSE_STATISTICS._asdict()))
+    for row in TextAnswer.objects.filter(contribution__course__semester=semester).values('contribution__course_id') \
+            .annotate(count=Count('id'), reviewed_count=Count(Case(When(~Q(state=TextAnswer.NOT_REVIEWED), then=1)))).order_by():
+        counts[row['contribution__course_id']]['num_textanswers'] = row['count']
+        counts[row['contribution__course_id']]['num_reviewed_textanswers'] = row['reviewed_count']
+    for row in GradeDocument.objects.filter(course__semester=semester).values('course_id', 'type').annotate(count=Count('id')).order_by():
+        field = 'num_final_grade_documents' if row['type'] == GradeDocument.FINAL_GRADES else 'num_midterm_grade_documents'
+        counts[row['course_id']][field] = row['count']
+    return {course_id: CourseStatistics(**course_counts) for course_id, course_counts in counts.items()}
+
+
+def annotate_courses_with_statistics(courses, semester):
+    """Sets the counts of `get_course_statistics` as attributes of the given courses of the semester."""
+    statistics = get_course_statistics(semester)
+    for course in courses:
+        course_statistics = statistics.get(course.id, EMPTY_COURSE_STATISTICS)
+        course.num_textanswers = course_statistics.num_textanswers
+        course.num_reviewed_textanswers = course_statistics.num_reviewed_textanswers
+        course.num_midterm_grade_documents = course_statistics.num_midterm_grade_documents
+        course.num_final_grade_documents = course_statistics.num_final_grade_documents
+
+
+def invalidate_semester_statistics(semester_ids):
+    cache.delete_many([get_semester_statistics_cache_key(semester_id) for semester_id in set(semester_ids)])
+
+
+# version of the format of the cached questions, see get_questions_of_questionnaires
+QUESTIONS_CACHE_VERSION = 1
+
+
+def get_questions_cache_key(questionnaire_id):
+    return 'evap.evaluation.tools.questions-{:d}'.format(questionnaire_id)
+
+
+def get_questions_of_questionnaires(questionnaires):
+    """Returns a dict mapping the ids of the given questionnaires to the lists of their questions
+    in the order of `questionnaire.question_set.all()`. The questions are cached until a question
+    of the questionnaire changes, so that voting forms can be built without database queries."""
+    cache_keys = {questionnaire.id: get_questions_cache_key(questionnaire.id) for questionnaire in questionnaires}
+    cached = cache.get_many(cache_keys.values())
+    result = {questionnaire_id: cached[cache_key][1] for questionnaire_id, cache_key in cache_keys.items()
+              if cache_key in cached and cached[cache_key][0] == QUESTIONS_CACHE_VERSION}
+
+    missing_ids = [questionnaire_id for questionnaire_id in cache_keys if questionnaire_id not in result]
+    if missing_ids:
+        questions = defaultdict(list)
+        for question in Question.objects.filter(questionnaire_id__in=missing_ids):
+            questions[question.questionnaire_id].append(question)
+        missing = {questionnaire_id: questions[questionnaire_id] for questionnaire_id in missing_ids}
+        cache.set_many({cache_keys[questionnaire_id]: (QUESTIONS_CACHE_VERSION, questionnaire_questions)
+                        for questionnaire_id, questionnaire_questions in missing.items()}, None)
+        result.update(missing)
+    return result
+
+
+def invalidate_questions_cache(questionnaire_ids):
+    cache.delete_many([get_questions_cache_key(questionnaire_id) for questionnaire_id in set(questionnaire_ids)])
+
+
+# see evap.student.tools.get_student_dashboard
+STUDENT_DASHBOARD_CACHE_VERSION_KEY = 'evap.evaluation.cache_versions.student_dashboard'
+STUDENT_DASHBOARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_student_dashboard_cache_key(user_id):
+    return 'evap.evaluation.tools.student_dashboard-{:d}'.format(user_id)
+
+
+def invalidate_student_dashboards(user_ids=None):
+    """Removes the cached dashboards of the given users. If no users are given, those of all users are
+    invalidated at once by incrementing the version of the cached dashboards."""
+    if user_ids is None:
+        increment_cache_version(STUDENT_DASHBOARD_CACHE_VERSION_KEY)
+    else:
+        cache.delete_many([get_student_dashboard_cache_key(user_id) for user_id in set(user_ids)])
+
+
 def is_external_email(email):
     return not any([email.endswith("@" + domain) for domain in settings.INSTITUTION_EMAIL_DOMAINS])
 
@@ -309,8 +722,3 @@ def sort_formset(request, formset):
 def course_types_in_semester(semester):
     return Course.objects.filter(semester=semester).values_list('type', flat=True).order_by().distinct()
 
-
-def has_no_rating_answers(course, contributor, questionnaire):
-    questions = questionnaire.rating_questions
-    contribution = Contribution.objects.get(course=course, contributor=contributor)
-    return RatingAnswerCounter.objects.filter(question__in=questions, contribution=contribution).count() == 0
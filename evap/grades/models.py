@@ -2,10 +2,12 @@ import os
 
 from django.conf import settings
 from django.db import models
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from evap.evaluation.meta import LocalizeModelBase, Translate
 from evap.evaluation.models import Course
+from evap.evaluation.tools import invalidate_semester_statistics, invalidate_student_dashboards
 
 
 def helper_upload_path(instance, filename):
@@ -47,6 +49,24 @@ class GradeDocument(models.Model, metaclass=LocalizeModelBase):
         return os.path.basename(self.file.name)
 
 
+@receiver(models.signals.post_save, sender=GradeDocument)
+@receiver(models.signals.post_delete, sender=GradeDocument)
+def invalidate_statistics_of_changed_grade_document(sender, instance, **kwargs):
+    invalidate_semester_statistics(Course.objects.filter(pk=instance.course_id).values_list('semester_id', flat=True))
+
+
+@receiver(models.signals.post_save, sender=GradeDocument)
+@receiver(models.signals.post_delete, sender=GradeDocument)
+def invalidate_student_dashboards_of_changed_grade_document(sender, instance, **kwargs):
+    invalidate_student_dashboards(Course.participants.through.objects.filter(course_id=instance.course_id).values_list('userprofile_id', flat=True))
+
+
 class SemesterGradeDownloadActivation(models.Model):
     semester = models.OneToOneField('evaluation.Semester', models.CASCADE, related_name='grades_downloadable')
     is_active = models.BooleanField(default=False)
+
+
+@receiver(models.signals.post_save, sender=SemesterGradeDownloadActivation)
+@receiver(models.signals.post_delete, sender=SemesterGradeDownloadActivation)
+def invalidate_student_dashboards_of_changed_activation(sender, **kwargs):
+    invalidate_student_dashboards()
@@ -12,7 +12,7 @@ from evap.evaluation.auth import grade_publisher_required, grade_downloader_requ
 from evap.evaluation.models import Semester, Contribution, Course
 from evap.grades.models import GradeDocument, SemesterGradeDownloadActivation
 from evap.grades.forms import GradeDocumentForm
-from evap.evaluation.tools import send_publish_notifications
+from evap.evaluation.tools import send_publish_notifications, annotate_courses_with_statistics
 
 from evap.staff.views import semester_view as staff_semester_view
 
@@ -25,19 +25,16 @@ def index(request):
     return render(request, "grades_index.html", template_data)
 
 
-def prefetch_data(courses):
-    courses = courses.prefetch_related(
+def prefetch_data(courses, semester):
+    courses = list(courses.select_related("type").prefetch_related(
         Prefetch("contributions", queryset=Contribution.objects.filter(responsible=True).select_related("contributor"), to_attr="responsible_contribution"),
-        "degrees")
+        "degrees"))
+    annotate_courses_with_statistics(courses, semester)
 
     course_data = []
     for course in courses:
         course.responsible_contributor = course.responsible_contribution[0].contributor
-        course_data.append((
-            course,
-            GradeDocument.objects.filter(course=course, type=GradeDocument.MIDTERM_GRADES).count(),
-            GradeDocument.objects.filter(course=course, type=GradeDocument.FINAL_GRADES).count()
-        ))
+        course_data.append((course, course.num_midterm_grade_documents, course.num_final_grade_documents))
 
     return course_data
 
@@ -47,7 +44,7 @@ def semester_view(request, semester_id):
     semester = get_object_or_404(Semester, id=semester_id)
 
     courses = semester.course_set.filter(is_graded=True).exclude(state='new')
-    courses = prefetch_data(courses)
+    courses = prefetch_data(courses, semester)
 
     template_data = dict(
         semester=semester,
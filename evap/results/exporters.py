@@ -5,7 +5,8 @@ from django.utils.translation import ugettext as _
 import xlwt
 
 from evap.evaluation.models import CourseType
-from evap.evaluation.tools import calculate_results, calculate_average_grades_and_deviation, get_grade_color, get_deviation_color, has_no_rating_answers
+from evap.evaluation.tools import calculate_results_for_courses, calculate_average_grades_and_deviation_from_results, \
+                                  get_grade_color, get_deviation_color, RatingResult
 
 
 class ExcelExporter(object):
@@ -94,12 +95,12 @@ class ExcelExporter(object):
                 course_states.extend(['evaluated', 'reviewed'])
 
             used_questionnaires = set()
-            for course in self.semester.course_set.filter(state__in=course_states, type__in=course_types).all():
-                if course.is_single_result:
-                    continue
+            courses = [course for course in self.semester.course_set.filter(state__in=course_states, type__in=course_types).all() if not course.is_single_result]
+            results_by_course = calculate_results_for_courses(courses)
+            for course in courses:
                 results = OrderedDict()
-                for questionnaire, contributor, __, data, __ in calculate_results(course):
-                    if has_no_rating_answers(course, contributor, questionnaire):
+                for questionnaire, __, __, data, __ in results_by_course[course]:
+                    if all(result.total_count == 0 for result in data if isinstance(result, RatingResult)):
                         continue
                     results.setdefault(questionnaire.id, []).extend(data)
                     used_questionnaires.add(questionnaire)
@@ -160,7 +161,7 @@ class ExcelExporter(object):
 
             writen(self, _("Overall Average Grade"), "bold")
             for course, results in courses_with_results:
-                avg, dev = calculate_average_grades_and_deviation(course)
+                avg, dev = calculate_average_grades_and_deviation_from_results(results_by_course[course])
                 if avg:
                     writec(self, avg, self.grade_to_style(avg, total=True), cols=2)
                 else:
@@ -168,7 +169,7 @@ class ExcelExporter(object):
 
             writen(self, _("Overall Average Standard Deviation"), "bold")
             for course, results in courses_with_results:
-                avg, dev = calculate_average_grades_and_deviation(course)
+                avg, dev = calculate_average_grades_and_deviation_from_results(results_by_course[course])
                 if dev is not None:
                     writec(self, dev, self.deviation_to_style(dev, total=True), cols=2)
                 else:
@@ -4,8 +4,9 @@ from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
 
-from evap.evaluation.models import Semester, Degree, Contribution
-from evap.evaluation.tools import calculate_results, calculate_average_grades_and_deviation, TextResult, RatingResult
+from evap.evaluation.models import Semester, Degree, Contribution, Course
+from evap.evaluation.tools import calculate_results, calculate_results_for_courses, calculate_average_grades_and_deviation, \
+                                  calculate_average_grades_and_deviation_for_courses, TextResult, RatingResult
 
 
 @login_required
@@ -18,13 +19,22 @@ def index(request):
 @login_required
 def semester_detail(request, semester_id):
     semester = get_object_or_404(Semester, id=semester_id)
-    courses = list(semester.course_set.filter(state="published").prefetch_related("degrees"))
-
-    courses = [course for course in courses if course.can_user_see_course(request.user)]
+    courses = list(semester.course_set.filter(state="published").visible_to(request.user).select_related("type")
+        .prefetch_related("contributions__contributor", "contributions__questionnaires", "degrees"))
 
     # Annotate each course object with its grades.
+    grades = calculate_average_grades_and_deviation_for_courses(courses)
     for course in courses:
-        course.avg_grade, course.avg_deviation = calculate_average_grades_and_deviation(course)
+        course.avg_grade, course.avg_deviation = grades[course]
+
+    single_result_courses = {course for course in courses if course.is_single_result}
+    single_results = calculate_results_for_courses(single_result_courses)
+
+    # the results of single results are always shown
+    other_courses = [course for course in courses if course not in single_result_courses]
+    courses_with_visible_results = set(Course.filter_courses_user_can_see_results(other_courses, request.user))
+    for course in other_courses:
+        course.can_see_results = course in courses_with_visible_results
 
     CourseTuple = namedtuple('CourseTuple', ('courses', 'single_results'))
 
@@ -32,9 +42,9 @@ def semester_detail(request, semester_id):
     for degree in Degree.objects.all():
         courses_by_degree[degree] = CourseTuple([], [])
     for course in courses:
-        if course.is_single_result:
+        if course in single_result_courses:
             for degree in course.degrees.all():
-                section = calculate_results(course)[0]
+                section = single_results[course][0]
                 result = section.results[0]
                 courses_by_degree[degree].single_results.append((course, result))
         else:
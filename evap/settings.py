@@ -96,13 +96,54 @@ DATABASES = {
 }
 
 CACHES = {
+    # keeps recently used results in every process and routes all entries to the shared caches below by their key prefix
     'default': {
+        'BACKEND': 'evap.evaluation.cache_backends.TwoTierCache',
+        'LOCATION': 'evap_local_cache',
+        'OPTIONS': {
+            'DEFAULT_BACKEND': 'shared',
+            # (key prefix, shared cache, whether the entries may be kept in the local tier)
+            'NAMESPACES': [
+                ('evap.staff.results.tools.calculate_results-', 'results', True),
+                ('evap.evaluation.cache_versions.', 'versions', False),
+                ('evap.evaluation.models.user_roles-', 'users', False),
+                ('evap.evaluation.tools.student_dashboard-', 'users', False),
+                ('template.cache.navbar.', 'users', False),
+            ],
+            'MAX_LOCAL_BYTES': 64 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 300,
+        }
+    },
+    # these can be replaced by any other shared cache, e.g. file based or redis caches, in the localsettings
+    'shared': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'evap_db_cache',
         'OPTIONS': {
-            'MAX_ENTRIES': 1000  # note that the results alone need one entry per course
+            'MAX_ENTRIES': 50000
         }
-    }
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'evap_db_cache_versions',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000  # the versions of the cached entries below, which must not be culled
+        }
+    },
+    'users': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'evap_db_cache_users',
+        'OPTIONS': {
+            # every user has a roles snapshot, a student dashboard and a navbar per language, so this holds 50000 users
+            'MAX_ENTRIES': 200000
+        }
+    },
+    'results': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'evap_db_cache_results',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000000  # the results need one entry per course and must not be culled
+        }
+    },
 }
 
 # Config for feedback links
@@ -190,8 +231,13 @@ MIDDLEWARE_CLASSES = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'evap.evaluation.auth.RequestAuthMiddleware',
+    'evap.evaluation.instrumentation.RequestInstrumentationMiddleware',
 ]
 
+# Share of requests (between 0 and 1) whose timings, SQL queries and cache accesses are recorded by the
+# RequestInstrumentationMiddleware. The measurements are shown on a staff page and logged. 0 disables the middleware.
+REQUEST_INSTRUMENTATION_SAMPLE_RATE = 0
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -210,6 +256,7 @@ TEMPLATES = [
                 "django.contrib.messages.context_processors.messages",
                 "evap.context_processors.legal_notice_active",
                 "evap.context_processors.tracker_url",
+                "evap.context_processors.navbar_cache_version",
             ],
             'builtins': ['django.templatetags.i18n'],
         },
@@ -336,6 +383,9 @@ TESTING = 'test' in sys.argv
 if TESTING:
     DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3'}  # use sqlite
     COMPRESS_PRECOMPILERS = ()  # disable compressor completely
+    # the tests use the database caches configured above, whose entries are rolled back after every test like all other
+    # data. the local tier is not reset between tests and therefore disabled, only TestTwoTierCache tests it with stand-ins.
+    CACHES['default']['OPTIONS']['MAX_LOCAL_BYTES'] = 0
 
 # Django debug toolbar settings
 if DEBUG and not TESTING and ENABLE_DEBUG_TOOLBAR:
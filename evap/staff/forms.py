@@ -12,7 +12,7 @@ from django.contrib.auth.models import Group
 
 from evap.evaluation.forms import BootstrapMixin, QuestionnaireMultipleChoiceField
 from evap.evaluation.models import Contribution, Course, Question, Questionnaire, Semester, UserProfile, FaqSection, \
-                                   FaqQuestion, EmailTemplate, TextAnswer, Degree, RatingAnswerCounter, CourseType
+                                   FaqQuestion, EmailTemplate, TextAnswer, Degree, RatingAnswerCounter, RatingAnswerAggregate, CourseType
 from evap.staff.fields import ToolTipModelMultipleChoiceField
 
 
@@ -203,6 +203,9 @@ class SingleResultForm(forms.ModelForm, BootstrapMixin):
             count = self.cleaned_data['answer_' + str(i)]
             total_votes += count
             RatingAnswerCounter.objects.update_or_create(contribution=contribution, question=single_result_question, answer=i, defaults={'count': count})
+        aggregate, __ = RatingAnswerAggregate.objects.get_or_create(contribution=contribution, question=single_result_question)
+        aggregate.recalculate()
+        aggregate.save()
         self.instance._participant_count = total_votes
         self.instance._voter_count = total_votes
 
@@ -486,6 +489,8 @@ class UserForm(forms.ModelForm, BootstrapMixin):
         else:
             self.instance.groups.remove(grade_user_group)
 
+        self.instance.invalidate_roles()
+
 
 class UserMergeSelectionForm(forms.Form, BootstrapMixin):
     main_user = forms.ModelChoiceField(UserProfile.objects.all())
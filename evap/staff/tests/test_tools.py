@@ -165,3 +165,7 @@ class MergeUsersTest(TestCase):
         self.assertTrue(RewardPointRedemption.objects.filter(user_profile=self.main_user).exists())
         self.assertFalse(RewardPointGranting.objects.filter(user_profile=self.other_user).exists())
         self.assertFalse(RewardPointRedemption.objects.filter(user_profile=self.other_user).exists())
+
+        # the participations of the deleted other user must not be counted anymore
+        for course in Course.objects.filter(pk__in=[self.course1.pk, self.course2.pk, self.course3.pk]):
+            self.assertEqual((course.num_participants, course.num_voters), (course.participants.count(), course.voters.count()))
@@ -10,8 +10,9 @@ from model_mommy import mommy
 import xlrd
 
 from evap.evaluation.models import Semester, UserProfile, Course, CourseType, TextAnswer, Contribution, Questionnaire, \
-                                   Question
+                                   Question, RatingAnswerCounter
 from evap.evaluation.tests.tools import FuzzyInt, WebTest, ViewTest
+from evap.evaluation.tools import get_navbar_cache_version
 
 
 class TestUserIndexView(ViewTest):
@@ -195,6 +196,31 @@ class TestCourseCommentsUpdatePublishView(WebTest):
         self.helper(TextAnswer.PUBLISHED, TextAnswer.NOT_REVIEWED, "unreview")
 
 
+class TestSemesterView(WebTest):
+    url = '/staff/semester/1'
+
+    @classmethod
+    def setUpTestData(cls):
+        mommy.make(UserProfile, username='staff', groups=[Group.objects.get(name='Staff')])
+        course = mommy.make(Course, semester=mommy.make(Semester, pk=1), state='reviewed',
+                            vote_start_date=datetime.date.today(), vote_end_date=datetime.date.today())
+        single_result_questionnaire = Questionnaire.get_single_result_questionnaire()
+        contribution = mommy.make(Contribution, course=course, contributor=mommy.make(UserProfile), responsible=True, can_edit=True,
+                                  comment_visibility=Contribution.ALL_COMMENTS, questionnaires=[single_result_questionnaire])
+        cls.answer_counter = mommy.make(RatingAnswerCounter, contribution=contribution, question=single_result_questionnaire.question_set.first(),
+                                        answer=1, count=0)
+
+    def test_single_results_without_answers_have_a_warning(self):
+        page = self.app.get(self.url, user='staff')
+        self.assertIn("Single result", page)
+        self.assertIn("Not enough participants to publish results", page)
+
+        self.answer_counter.count = 1
+        self.answer_counter.save()
+        page = self.app.get(self.url, user='staff')
+        self.assertNotIn("Not enough participants to publish results", page)
+
+
 class ArchivingTests(WebTest):
 
     def test_raise_403(self):
@@ -324,9 +350,11 @@ class TestSemesterDeleteView(ViewTest):
     def test_success(self):
         semester = mommy.make(Semester, pk=1)
         self.assertTrue(semester.can_staff_delete)
+        navbar_cache_version = get_navbar_cache_version()
         response = self.app.post(self.url, {'semester_id': 1}, user='staff')
         self.assertEqual(response.status_code, 200)
         self.assertFalse(Semester.objects.filter(pk=1).exists())
+        self.assertNotEqual(get_navbar_cache_version(), navbar_cache_version)
 
 
 class TestCourseCreateView(ViewTest):
@@ -4,8 +4,6 @@ from django.contrib import messages
 from django.contrib.auth.models import Group
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.db import transaction
 
 from evap.evaluation.models import UserProfile, Course, Contribution
@@ -18,15 +16,6 @@ def custom_redirect(url_name, *args, **kwargs):
     return HttpResponseRedirect(url + "?%s" % params)
 
 
-def delete_navbar_cache():
-    # delete navbar cache from base.html
-    for user in UserProfile.objects.all():
-        key = make_template_fragment_key('navbar', [user.username, 'de'])
-        cache.delete(key)
-        key = make_template_fragment_key('navbar', [user.username, 'en'])
-        cache.delete(key)
-
-
 def bulk_delete_users(request, username_file, test_run):
     usernames = [u.strip() for u in username_file.readlines()]
     users = UserProfile.objects.filter(username__in=usernames)
@@ -98,6 +87,7 @@ def merge_users(main_user, other_user, preview=False):
     for key, value in merged_user.items():
         setattr(main_user, key, value)
     main_user.save()
+    main_user.invalidate_roles()
 
     # delete rewards
     other_user.reward_point_grantings.all().delete()
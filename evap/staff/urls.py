@@ -66,4 +66,7 @@ urlpatterns = [
 
     url(r"faq/$", faq_index, name="faq_index"),
     url(r"faq/(\d+)$", faq_section, name="faq_section"),
+
+    url(r"^request_statistics/$", request_statistics, name="request_statistics"),
+    url(r"^request_statistics/export$", request_statistics_export, name="request_statistics_export"),
 ]
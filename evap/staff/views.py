@@ -3,10 +3,11 @@ import datetime
 import random
 from collections import OrderedDict, defaultdict
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
 from django.db import transaction, IntegrityError
-from django.db.models import Max, Count, Q, BooleanField, ExpressionWrapper, Sum, Case, When, IntegerField
+from django.db.models import Max, Q, BooleanField, ExpressionWrapper, Sum, Case, When, IntegerField
 from django.forms.models import inlineformset_factory, modelformset_factory
 from django.forms import formset_factory
 from django.shortcuts import get_object_or_404, redirect, render
@@ -18,18 +19,19 @@ from django.db.models import Prefetch
 from django.views.decorators.http import require_POST
 
 from evap.evaluation.auth import staff_required
-from evap.evaluation.models import Contribution, Course, Question, Questionnaire, Semester, \
+from evap.evaluation.instrumentation import get_request_statistics, reset_request_statistics
+from evap.evaluation.models import Contribution, Course, Question, Questionnaire, RatingAnswerCounter, Semester, \
                                    TextAnswer, UserProfile, FaqSection, FaqQuestion, EmailTemplate, Degree, CourseType
 from evap.evaluation.tools import STATES_ORDERED, questionnaires_and_contributions, get_textanswers, CommentSection, \
                                   TextResult, send_publish_notifications, sort_formset, \
-                                  calculate_average_grades_and_deviation
+                                  calculate_average_grades_and_deviation_for_courses, annotate_courses_with_statistics
 from evap.staff.forms import ContributionForm, AtLeastOneFormSet, CourseForm, CourseEmailForm, EmailTemplateForm, \
                              ImportForm, LotteryForm, QuestionForm, QuestionnaireForm, QuestionnairesAssignForm, \
                              SemesterForm, UserForm, ContributionFormSet, FaqSectionForm, FaqQuestionForm, \
                              UserImportForm, TextAnswerForm, DegreeForm, SingleResultForm, ExportSheetForm, \
                              UserMergeSelectionForm, CourseTypeForm, UserBulkDeleteForm, CourseTypeMergeSelectionForm
 from evap.staff.importers import EnrollmentImporter, UserImporter
-from evap.staff.tools import custom_redirect, delete_navbar_cache, merge_users, bulk_delete_users
+from evap.staff.tools import custom_redirect, merge_users, bulk_delete_users
 from evap.student.views import vote_preview
 from evap.student.forms import QuestionsForm
 from evap.rewards.models import RewardPointGranting
@@ -53,21 +55,16 @@ def index(request):
 
 
 def get_courses_with_prefetched_data(semester):
-    courses = semester.course_set.prefetch_related(
-        Prefetch("contributions", queryset=Contribution.objects.filter(responsible=True).select_related("contributor"), to_attr="responsible_contribution"),
-        Prefetch("contributions", queryset=Contribution.objects.filter(contributor=None), to_attr="general_contribution"),
-        "degrees")
-    participant_counts = semester.course_set.annotate(num_participants=Count("participants")).values_list("num_participants", flat=True)
-    voter_counts = semester.course_set.annotate(num_voters=Count("voters")).values_list("num_voters", flat=True)
-    textanswer_counts = semester.course_set.annotate(num_textanswers=Count("contributions__textanswer_set")).values_list("num_textanswers", flat=True)
-
-    for course, participant_count, voter_count, textanswer_count in zip(courses, participant_counts, voter_counts, textanswer_counts):
-        course.general_contribution = course.general_contribution[0]
-        course.responsible_contributor = course.responsible_contribution[0].contributor
-        course.num_textanswers = textanswer_count
-        if course._participant_count is None:
-            course.num_voters = voter_count
-            course.num_participants = participant_count
+    courses = list(semester.course_set.select_related("type").prefetch_related(
+        Prefetch("contributions", queryset=Contribution.objects.select_related("contributor")), "contributions__questionnaires", "degrees"))
+    annotate_courses_with_statistics(courses, semester)
+
+    # single results can be published once they have answers, which are counted for all of them at once
+    single_result_courses = [course for course in courses if course.is_single_result]
+    answer_counts = dict(RatingAnswerCounter.objects.filter(contribution__course__in=single_result_courses)
+                         .values_list('contribution__course_id').annotate(Sum('count')).order_by())
+    for course in single_result_courses:
+        course.can_publish_grades = answer_counts.get(course.pk, 0) > 0
     return courses
 
 
@@ -270,7 +267,6 @@ def semester_create(request):
 
     if form.is_valid():
         semester = form.save()
-        delete_navbar_cache()
 
         messages.success(request, _("Successfully created semester."))
         return redirect('staff:semester_view', semester.id)
@@ -301,7 +297,6 @@ def semester_delete(request):
     if not semester.can_staff_delete:
         raise SuspiciousOperation("Deleting semester not allowed")
     semester.delete()
-    delete_navbar_cache()
     return HttpResponse()  # 200 OK
 
 
@@ -368,9 +363,11 @@ def semester_raw_export(request, semester_id):
     writer = csv.writer(response, delimiter=";")
     writer.writerow([_('Name'), _('Degrees'), _('Type'), _('Single result'), _('State'), _('#Voters'),
         _('#Participants'), _('#Comments'), _('Average grade')])
-    for course in semester.course_set.all():
+    courses = semester.course_set.select_related("type").prefetch_related("degrees")
+    grades = calculate_average_grades_and_deviation_for_courses(courses)
+    for course in courses:
         degrees = ", ".join([degree.name for degree in course.degrees.all()])
-        course.avg_grade, course.avg_deviation = calculate_average_grades_and_deviation(course)
+        course.avg_grade, course.avg_deviation = grades[course]
         if course.state in ['evaluated', 'reviewed', 'published'] and course.avg_grade is not None:
             avg_grade = "{:.1f}".format(course.avg_grade)
         else:
@@ -1162,3 +1159,28 @@ def faq_section(request, section_id):
     else:
         template_data = dict(formset=formset, section=section, questions=questions)
         return render(request, "staff_faq_section.html", template_data)
+
+
+@staff_required
+def request_statistics(request):
+    if request.method == 'POST':
+        reset_request_statistics()
+        messages.success(request, _("Successfully reset the request statistics."))
+        return redirect('staff:request_statistics')
+
+    template_data = dict(statistics=get_request_statistics(), sample_rate=settings.REQUEST_INSTRUMENTATION_SAMPLE_RATE)
+    return render(request, "staff_request_statistics.html", template_data)
+
+
+@staff_required
+def request_statistics_export(request):
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = "attachment; filename=\"request_statistics.csv\""
+
+    fields = ['url_name', 'requests', 'time', 'max_time', 'queries', 'query_time', 'cache_hits', 'cache_misses', 'template_time']
+    writer = csv.writer(response, delimiter=";")
+    writer.writerow(fields)
+    for entry in get_request_statistics():
+        writer.writerow([entry[field] for field in fields])
+
+    return response
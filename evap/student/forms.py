@@ -1,7 +1,7 @@
 from django import forms
 
 from evap.student.tools import make_form_identifier
-from evap.evaluation.tools import LIKERT_NAMES, GRADE_NAMES
+from evap.evaluation.tools import LIKERT_NAMES, GRADE_NAMES, get_questions_of_questionnaires
 
 
 LIKERT_CHOICES = [(str(k), v) for k, v in LIKERT_NAMES.items()]
@@ -10,17 +10,22 @@ GRADE_CHOICES = [(str(k), v) for k, v in GRADE_NAMES.items()]
 
 class QuestionsForm(forms.Form):
     """Dynamic form class that adds one field per question. Pass the arguments
-    `contribution` and `questionnaire` to the constructor.
+    `contribution` and `questionnaire` to the constructor. The questions are taken
+    from the cache, or from the optional argument `questions` if they were already
+    fetched for several questionnaires with `get_questions_of_questionnaires`.
 
     See http://jacobian.org/writing/dynamic-form-generation/"""
 
     def __init__(self, *args, **kwargs):
         self.contribution = kwargs.pop('contribution')
         self.questionnaire = kwargs.pop('questionnaire')
+        self.questions = kwargs.pop('questions', None)
+        if self.questions is None:
+            self.questions = get_questions_of_questionnaires([self.questionnaire])[self.questionnaire.id]
 
         super().__init__(*args, **kwargs)
 
-        for question in self.questionnaire.question_set.all():
+        for question in self.questions:
             # generic arguments for all kinds of fields
             field_args = dict(label=question.text)
 
@@ -1,9 +1,24 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
 from model_mommy import mommy
 
 from django_webtest import WebTest
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from evap.evaluation.models import Course, UserProfile, Contribution, Questionnaire, Question
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from evap.evaluation.models import Course, UserProfile, Contribution, Questionnaire, Question, RatingAnswerCounter, \
+                                   RatingAnswerAggregate, TextAnswer, Semester
+from evap.evaluation.tests.tools import FuzzyInt
+from evap.evaluation.tools import STUDENT_DASHBOARD_CACHE_VERSION_KEY, invalidate_student_dashboards
+from evap.grades.models import GradeDocument
+from evap.student import tools
+from evap.student.forms import QuestionsForm
+from evap.student.tools import get_student_dashboard, make_form_identifier, save_answers
 
 
 class VoteTests(WebTest):
@@ -30,3 +45,165 @@ class VoteTests(WebTest):
         response = get_vote_page(student)
         self.assertTrue(any(contributor == contributor1 for contributor, _, _, _ in response.context['contributor_form_groups']),
             "Regular students should see the questionnaire about a contributor")
+
+    def test_vote_updates_answer_counters_and_aggregates(self):
+        student = mommy.make(UserProfile)
+        course = mommy.make(Course, state='in_evaluation', participants=[student],
+                            vote_start_date=date.today() - timedelta(days=1), vote_end_date=date.today() + timedelta(days=1))
+        questionnaire = mommy.make(Questionnaire)
+        question = mommy.make(Question, questionnaire=questionnaire, type="G")
+        course.general_contribution.questionnaires = [questionnaire]
+        mommy.make(RatingAnswerCounter, contribution=course.general_contribution, question=question, answer=1, count=1)
+        mommy.make(RatingAnswerAggregate, contribution=course.general_contribution, question=question, total_count=1, answer_sum=1, answer_square_sum=1)
+
+        form = self.app.get(reverse('student:vote', kwargs={'course_id': course.id}), user=student).forms['student-vote-form']
+        form[make_form_identifier(course.general_contribution, questionnaire, question)] = 3
+        form.submit()
+
+        self.assertEqual(RatingAnswerCounter.objects.get(question=question, answer=3).count, 1)
+        aggregate = RatingAnswerAggregate.objects.get(contribution=course.general_contribution, question=question)
+        self.assertEqual((aggregate.total_count, aggregate.answer_sum, aggregate.answer_square_sum), (2, 4, 10))
+        self.assertEqual(aggregate.average, 2)
+        self.assertEqual(aggregate.deviation, 1)
+
+    def test_vote_query_count_does_not_grow_with_contributors(self):
+        course = mommy.make(Course, state='in_evaluation', vote_start_date=date.today() - timedelta(days=1), vote_end_date=date.today() + timedelta(days=1))
+        questionnaire = mommy.make(Questionnaire)
+        mommy.make(Question, questionnaire=questionnaire, type="G", _quantity=2)
+        course.general_contribution.questionnaires = [questionnaire]
+
+        def count_vote_queries(student):
+            course.participants.add(student)
+            url = reverse('student:vote', kwargs={'course_id': course.id})
+            self.app.get(url, user=student)  # fill the caches
+            with CaptureQueriesContext(connection) as get_queries:
+                form = self.app.get(url, user=student).forms['student-vote-form']
+            for name in form.fields:
+                if name and name.startswith('question_'):
+                    form[name] = 2
+            with CaptureQueriesContext(connection) as post_queries:
+                form.submit()
+            return len(get_queries), len(post_queries)
+
+        mommy.make(Contribution, course=course, contributor=mommy.make(UserProfile), questionnaires=[questionnaire])
+        query_counts = count_vote_queries(mommy.make(UserProfile))
+        for __ in range(5):
+            mommy.make(Contribution, course=course, contributor=mommy.make(UserProfile), questionnaires=[questionnaire])
+        self.assertEqual(count_vote_queries(mommy.make(UserProfile)), query_counts)
+
+
+class QuestionsFormTests(TestCase):
+    def test_form_is_built_from_cached_questions(self):
+        contribution = mommy.make(Contribution)
+        questionnaire = mommy.make(Questionnaire)
+        text_question = mommy.make(Question, questionnaire=questionnaire, type="T", order=2)
+        grade_question = mommy.make(Question, questionnaire=questionnaire, type="G", order=1)
+        QuestionsForm(contribution=contribution, questionnaire=questionnaire)
+
+        with patch('evap.evaluation.tools.Question.objects.filter') as mock:
+            form = QuestionsForm(contribution=contribution, questionnaire=questionnaire)
+        self.assertEqual(mock.call_count, 0)
+        self.assertEqual(form.questions, [grade_question, text_question])
+        self.assertEqual(list(form.fields), [make_form_identifier(contribution, questionnaire, question) for question in [grade_question, text_question]])
+
+    def test_changed_questions_invalidate_the_cache(self):
+        contribution = mommy.make(Contribution)
+        questionnaire = mommy.make(Questionnaire)
+        question = mommy.make(Question, questionnaire=questionnaire, type="G", text_en="old text", text_de="old text")
+        QuestionsForm(contribution=contribution, questionnaire=questionnaire)
+
+        question.text_en = question.text_de = "new text"
+        question.save()
+        new_question = mommy.make(Question, questionnaire=questionnaire, type="T")
+        form = QuestionsForm(contribution=contribution, questionnaire=questionnaire)
+        self.assertEqual([field.label for field in form.fields.values()], ["new text", new_question.text])
+
+        new_question.delete()
+        self.assertEqual(len(QuestionsForm(contribution=contribution, questionnaire=questionnaire).fields), 1)
+
+
+class SaveAnswersTests(TestCase):
+    def test_increments_existing_and_creates_missing_counters(self):
+        contribution = mommy.make(Contribution)
+        grade_question = mommy.make(Question, type="G")
+        likert_question = mommy.make(Question, type="L")
+        text_question = mommy.make(Question, type="T")
+        mommy.make(RatingAnswerCounter, contribution=contribution, question=grade_question, answer=2, count=4)
+
+        # creating missing counters and aggregates needs savepoints and a second lookup
+        with self.assertNumQueries(FuzzyInt(0, 14)):
+            save_answers([(contribution, grade_question, 2), (contribution, likert_question, 5)],
+                         [TextAnswer(contribution=contribution, question=text_question, answer="text")])
+
+        self.assertEqual(RatingAnswerCounter.objects.get(question=grade_question, answer=2).count, 5)
+        self.assertEqual(RatingAnswerCounter.objects.get(question=likert_question, answer=5).count, 1)
+        aggregate = RatingAnswerAggregate.objects.get(question=likert_question)
+        self.assertEqual((aggregate.total_count, aggregate.answer_sum, aggregate.answer_square_sum), (1, 5, 25))
+        self.assertEqual(TextAnswer.objects.get(question=text_question).answer, "text")
+
+
+class StudentDashboardTests(TestCase):
+    def setUp(self):
+        self.student = mommy.make(UserProfile)
+        self.semester = mommy.make(Semester)
+
+    def make_course(self, state, **kwargs):
+        return mommy.make(Course, semester=self.semester, state=state, participants=[self.student], **kwargs)
+
+    def test_groups_sorts_and_flags_courses(self):
+        other_semester = mommy.make(Semester)
+        mommy.make(Course, semester=other_semester, state='new', participants=[self.student])
+        published = self.make_course('published', voters=[self.student])
+        due = self.make_course('in_evaluation', vote_end_date=date.today() + timedelta(days=3))
+        voted = self.make_course('in_evaluation', vote_end_date=date.today() + timedelta(days=2), voters=[self.student])
+        upcoming = self.make_course('approved')
+
+        semester_list = get_student_dashboard(self.student)
+
+        self.assertEqual(len(semester_list), 1)
+        self.assertEqual(semester_list[0]['semester'], self.semester)
+        self.assertEqual(semester_list[0]['courses'], [voted, due, upcoming, published])
+        self.assertEqual([(course.voted, course.due) for course in semester_list[0]['courses']],
+                         [(True, False), (False, True), (False, False), (True, False)])
+
+    def test_dashboard_is_cached_until_the_user_votes(self):
+        course = self.make_course('in_evaluation')
+        get_student_dashboard(self.student)
+
+        with patch.object(tools, '_build_student_dashboard', wraps=tools._build_student_dashboard) as mock:
+            self.assertTrue(get_student_dashboard(self.student)[0]['courses'][0].due)
+            self.assertEqual(mock.call_count, 0)
+
+            course.voters.add(self.student)
+            self.assertFalse(get_student_dashboard(self.student)[0]['courses'][0].due)
+            self.assertEqual(mock.call_count, 1)
+
+    def test_dashboard_is_invalidated_after_losing_the_version(self):
+        course = self.make_course('in_evaluation')
+        # the version can be culled from the cache
+        cache.delete(STUDENT_DASHBOARD_CACHE_VERSION_KEY)
+        with patch('evap.evaluation.tools.time') as mock:
+            mock.time.return_value = 1000
+            invalidate_student_dashboards()
+        get_student_dashboard(self.student)
+        Course.objects.filter(pk=course.pk).update(name_en="new name")
+
+        cache.delete(STUDENT_DASHBOARD_CACHE_VERSION_KEY)
+        with patch('evap.evaluation.tools.time') as mock:
+            mock.time.return_value = 2000
+            invalidate_student_dashboards()
+        self.assertEqual(get_student_dashboard(self.student)[0]['courses'][0].name_en, "new name")
+
+    def test_dashboard_is_invalidated_by_course_changes(self):
+        course = self.make_course('in_evaluation')
+        get_student_dashboard(self.student)
+
+        course.evaluation_end()
+        course.save()
+        self.assertEqual(get_student_dashboard(self.student)[0]['courses'][0].state, 'evaluated')
+
+        mommy.make(GradeDocument, course=course)
+        self.assertEqual(len(get_student_dashboard(self.student)[0]['courses'][0].grade_documents.all()), 1)
+
+        course.participants.remove(self.student)
+        self.assertEqual(get_student_dashboard(self.student), [])
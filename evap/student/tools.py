@@ -1,3 +1,18 @@
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from evap.evaluation.models import RatingAnswerCounter, RatingAnswerAggregate, TextAnswer
+from evap.evaluation.tools import STUDENT_STATES_ORDERED, STUDENT_DASHBOARD_CACHE_TIMEOUT, STUDENT_DASHBOARD_CACHE_VERSION_KEY, \
+                                  get_cache_version, get_student_dashboard_cache_key
+from evap.grades.models import SemesterGradeDownloadActivation
+
+
+STUDENT_STATE_POSITIONS = {state: position for position, state in enumerate(STUDENT_STATES_ORDERED)}
+
+
 def make_form_identifier(contribution, questionnaire, question):
     """Generates a form field identifier for voting forms using the given
     parameters."""
@@ -6,3 +21,91 @@ def make_form_identifier(contribution, questionnaire, question):
         contribution.id,
         questionnaire.id,
         question.id)
+
+
+def save_answers(rating_answers, text_answers):
+    """Saves all answers of a single vote using a constant number of queries.
+    `rating_answers` is a list of (contribution, question, answer) tuples and
+    `text_answers` a list of unsaved `TextAnswer`s.
+
+    Answer counters and aggregates are incremented in the database, so
+    concurrent votes can't overwrite each other. Call this inside a transaction."""
+    if rating_answers:
+        answer_counters = _get_or_create_in_bulk(RatingAnswerCounter, ('contribution_id', 'question_id', 'answer'),
+            [(contribution.id, question.id, answer) for contribution, question, answer in rating_answers])
+        RatingAnswerCounter.objects.filter(pk__in=[answer_counter.pk for answer_counter in answer_counters.values()]).update(count=F('count') + 1)
+
+        aggregates = _get_or_create_in_bulk(RatingAnswerAggregate, ('contribution_id', 'question_id'),
+            [(contribution.id, question.id) for contribution, question, __ in rating_answers])
+        aggregate_ids_by_answer = defaultdict(list)
+        for contribution, question, answer in rating_answers:
+            aggregate_ids_by_answer[answer].append(aggregates[(contribution.id, question.id)].pk)
+        for answer, aggregate_ids in aggregate_ids_by_answer.items():
+            RatingAnswerAggregate.objects.filter(pk__in=aggregate_ids).update(
+                total_count=F('total_count') + 1, answer_sum=F('answer_sum') + answer, answer_square_sum=F('answer_square_sum') + answer * answer)
+
+    TextAnswer.objects.bulk_create(text_answers)
+
+
+def _get_or_create_in_bulk(model, fields, keys):
+    """Returns a dict mapping each of the given tuples of values for `fields` to
+    the matching instance of `model`. Missing instances are created in bulk."""
+    def fetch():
+        candidates = model.objects.filter(**{field + '__in': set(key[i] for key in keys) for i, field in enumerate(fields)})
+        instances = {tuple(getattr(instance, field) for field in fields): instance for instance in candidates}
+        return {key: instances[key] for key in keys if key in instances}
+
+    instances = fetch()
+    missing_keys = [key for key in set(keys) if key not in instances]
+    if not missing_keys:
+        return instances
+
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(model(**dict(zip(fields, key))) for key in missing_keys)
+    except IntegrityError:
+        # a concurrent vote created some of the instances in the meantime
+        for key in missing_keys:
+            model.objects.get_or_create(**dict(zip(fields, key)))
+    return fetch()
+
+
+def get_student_dashboard(user):
+    """Returns a list of dicts containing each semester and its id in which the user
+    participates in courses that are not new, whether its grades are activated, and these
+    courses sorted by their state, end of evaluation and name. The courses have the flags
+    `voted` and `due` and their type and grade documents are prefetched.
+
+    The dashboard is cached until the user votes or the user's courses or their participants,
+    grade documents or semesters change, see the signal handlers in evap.evaluation.models."""
+    cache_key = get_student_dashboard_cache_key(user.pk)
+    cached = cache.get_many([STUDENT_DASHBOARD_CACHE_VERSION_KEY, cache_key])
+    version = cached[STUDENT_DASHBOARD_CACHE_VERSION_KEY] if STUDENT_DASHBOARD_CACHE_VERSION_KEY in cached \
+        else get_cache_version(STUDENT_DASHBOARD_CACHE_VERSION_KEY)
+    if cache_key in cached and cached[cache_key][0] == version:
+        semester_list = cached[cache_key][1]
+    else:
+        semester_list = _build_student_dashboard(user)
+        cache.set(cache_key, (version, semester_list), STUDENT_DASHBOARD_CACHE_TIMEOUT)
+
+    # the names depend on the language, so the courses are sorted after leaving the cache
+    for semester in semester_list:
+        semester['courses'].sort(key=lambda course: (STUDENT_STATE_POSITIONS[course.student_state], course.vote_end_date, course.name))
+    return semester_list
+
+
+def _build_student_dashboard(user):
+    courses = user.courses_participating_in.exclude(state='new').select_related('semester', 'type').prefetch_related('grade_documents') \
+        .order_by('-semester__created_at', 'semester__name_de')
+    voted_course_ids = set(user.courses_voted_for.values_list('pk', flat=True))
+    activated_semester_ids = set(SemesterGradeDownloadActivation.objects.filter(is_active=True).values_list('semester_id', flat=True))
+
+    semesters = OrderedDict()
+    for course in courses:
+        course.voted = course.pk in voted_course_ids
+        course.due = course.state == 'in_evaluation' and not course.voted
+        if course.semester_id not in semesters:
+            semesters[course.semester_id] = dict(semester=course.semester, id=course.semester_id,
+                grades_activated=course.semester_id in activated_semester_ids, courses=[])
+        semesters[course.semester_id]['courses'].append(course)
+    return list(semesters.values())
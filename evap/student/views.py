@@ -7,30 +7,17 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.translation import ugettext as _
 
 from evap.evaluation.auth import participant_required
-from evap.evaluation.models import Course, Semester
-from evap.evaluation.tools import STUDENT_STATES_ORDERED
+from evap.evaluation.models import Course, TextAnswer
+from evap.evaluation.tools import get_questions_of_questionnaires
 
 from evap.student.forms import QuestionsForm
-from evap.student.tools import make_form_identifier
+from evap.student.tools import get_student_dashboard, make_form_identifier, save_answers
 
 
 @participant_required
 def index(request):
-    # retrieve all courses, where the user is a participant and that are not new
-    courses = list(set(Course.objects.filter(participants=request.user).exclude(state="new")))
-    voted_courses = list(set(Course.objects.filter(voters=request.user)))
-    due_courses = list(set(Course.objects.filter(participants=request.user, state='in_evaluation').exclude(voters=request.user)))
-
-    sorter = lambda course: (list(STUDENT_STATES_ORDERED.keys()).index(course.student_state), course.vote_end_date, course.name)
-    courses.sort(key=sorter)
-
-    semesters = Semester.objects.all()
-    semester_list = [dict(semester_name=semester.name, id=semester.id, courses=[course for course in courses if course.semester_id == semester.id]) for semester in semesters]
-
     template_data = dict(
-        semester_list=semester_list,
-        voted_courses=voted_courses,
-        due_courses=due_courses,
+        semester_list=get_student_dashboard(request.user),
         can_download_grades=request.user.can_download_grades,
     )
     return render(request, "student_index.html", template_data)
@@ -82,25 +69,24 @@ def vote(request, course_id):
         return render(request, "student_vote.html", template_data)
 
     # all forms are valid, begin vote operation
+    rating_answers = []
+    text_answers = []
+    for contribution, form_group in form_groups.items():
+        for questionnaire_form in form_group:
+            questionnaire = questionnaire_form.questionnaire
+            for question in questionnaire_form.questions:
+                identifier = make_form_identifier(contribution, questionnaire, question)
+                value = questionnaire_form.cleaned_data.get(identifier)
+
+                if question.is_text_question:
+                    if value:
+                        text_answers.append(TextAnswer(contribution=contribution, question=question, answer=value))
+                else:
+                    if value != 6:
+                        rating_answers.append((contribution, question, value))
+
     with transaction.atomic():
-        for contribution, form_group in form_groups.items():
-            for questionnaire_form in form_group:
-                questionnaire = questionnaire_form.questionnaire
-                for question in questionnaire.question_set.all():
-                    identifier = make_form_identifier(contribution, questionnaire, question)
-                    value = questionnaire_form.cleaned_data.get(identifier)
-
-                    if question.is_text_question:
-                        if value:
-                            question.answer_class.objects.create(
-                                contribution=contribution,
-                                question=question,
-                                answer=value)
-                    else:
-                        if value != 6:
-                            answer_counter, __ = question.answer_class.objects.get_or_create(contribution=contribution, question=question, answer=value)
-                            answer_counter.add_vote()
-                            answer_counter.save()
+        save_answers(rating_answers, text_answers)
 
         # remember that the user voted already
         course.voters.add(request.user)
@@ -111,14 +97,16 @@ def vote(request, course_id):
     return redirect('student:index')
 
 
-def helper_create_form_group(request, contribution):
-    return list(QuestionsForm(request.POST or None, contribution=contribution, questionnaire=questionnaire) for questionnaire in contribution.questionnaires.all())
-
-
 def helper_create_voting_form_groups(request, contributions):
+    # the contributors and questionnaires of all contributions are fetched at once and the questions are taken from the cache,
+    # so that the forms are created, validated and saved with a constant number of queries
+    contributions = contributions.select_related('contributor').prefetch_related('questionnaires')
+    questions = get_questions_of_questionnaires(set(questionnaire for contribution in contributions for questionnaire in contribution.questionnaires.all()))
+
     form_groups = OrderedDict()
     for contribution in contributions:
-        form_groups[contribution] = helper_create_form_group(request, contribution)
+        form_groups[contribution] = [QuestionsForm(request.POST or None, contribution=contribution, questionnaire=questionnaire, questions=questions[questionnaire.id])
+                                     for questionnaire in contribution.questionnaires.all()]
     return form_groups
 
 